@@ -2,16 +2,18 @@ import random
 import string
 from dataclasses import InitVar, dataclass
 from typing import Any, Dict, List, Optional, Union
-import time
-import openai
-import httpx
-import ollama
 
 from autogen import ConversableAgent
 from autogen.agentchat.agent import Agent
 from itakello_logging import ItakelloLogging
 
+from ...utility.enums import StreamMode
+from ..llm.generation_limits import GenerationLimits
+from ..llm.live_view import LiveView
 from ..llm.llm import LLM
+from ..llm.llm_client import LLMClient
+from ..llm.resilience import Resilience
+from ..llm.response_cache import ResponseCache
 from ..section.section import Section
 
 logger = ItakelloLogging().get_logger(__name__)
@@ -25,20 +27,48 @@ class CustomAgent(ConversableAgent):
 
     placeholders: InitVar[dict[str, str]]
     sections: InitVar[list[Section]]
+    agent_name: InitVar[str] = ""
+    name_seed: InitVar[str] = ""
+    cache: InitVar[ResponseCache | None] = None
+    resilience: InitVar[Resilience | None] = None
+    limits: InitVar[GenerationLimits | None] = None
+    stream: InitVar[StreamMode] = StreamMode.OFF
 
     def __post_init__(
-        self, placeholders: dict[str, str], sections: list[Section]
+        self,
+        placeholders: dict[str, str],
+        sections: list[Section],
+        agent_name: str,
+        name_seed: str,
+        cache: ResponseCache | None,
+        resilience: Resilience | None,
+        limits: GenerationLimits | None,
+        stream: StreamMode,
     ) -> None:
-        name = self.role.capitalize() + "_" + self._get_random_numeric_string()
+        limits = limits or GenerationLimits()
+        name = (
+            agent_name
+            or self.role.capitalize()
+            + "_"
+            + self._get_random_numeric_string(seed=name_seed)
+        )
         system_message = self._generate_system_message(sections, placeholders)
         super().__init__(
             name=name,
-            llm_config=self.llm.config,
+            llm_config=limits.apply(self.llm.llm_config),
             system_message=system_message,
             human_input_mode="NEVER",
             code_execution_config=False,
             # description=f"A {self.role} named {name}",
         )
+        self.llm_client = LLMClient(
+            llm=self.llm,
+            cache=cache,
+            resilience=resilience or Resilience(),
+            limits=limits,
+            stream=stream != StreamMode.OFF,
+            live_view=LiveView(name=name) if stream == StreamMode.LIVE else None,
+        )
 
     def _generate_system_message(
         self, sections: list[Section], placeholders: dict[str, str]
@@ -52,8 +82,10 @@ class CustomAgent(ConversableAgent):
         system_message = "\n".join(final_contents)
         return system_message
 
-    def _get_random_numeric_string(self, lenght: int = 3) -> str:
-        return "".join(random.choices(string.digits, k=lenght))
+    def _get_random_numeric_string(self, lenght: int = 3, seed: str = "") -> str:
+        # A seed makes the agent names, and thus the cached prompts, reproducible
+        rng = random.Random(seed) if seed else random
+        return "".join(rng.choices(string.digits, k=lenght))
 
     def generate_reply(
         self,
@@ -61,67 +93,24 @@ class CustomAgent(ConversableAgent):
         sender: Optional[Union["Agent", None]] = None,
         **kwargs: Any,
     ) -> Union[str, Dict, None]:
-        """
-        Generate a reply with retry logic for transient LLM errors.
-        """
-        MAX_RETRIES = 3
-        attempts = 0
-        while True:
-            try:
-                reply = super().generate_reply(messages=messages, sender=sender, **kwargs)
-                break
-            except (openai.error.OpenAIError, httpx.HTTPError, ollama.ResponseError) as e:
-                attempts += 1
-                if attempts >= MAX_RETRIES:
-                    logger.error(f"LLM generation failed after {attempts} attempts: {e}")
-                    raise
-                logger.warning(f"Error generating reply (attempt {attempts}/{MAX_RETRIES}): {e}. Retrying...")
-                time.sleep(2 ** attempts)
-            except Exception as e:
-                attempts += 1
-                if attempts >= MAX_RETRIES:
-                    logger.error(f"Unexpected error generating reply after {attempts} attempts: {e}")
-                    raise
-                logger.warning(f"Unexpected error generating reply (attempt {attempts}/{MAX_RETRIES}): {e}. Retrying...")
-                time.sleep(2 ** attempts)
-        # Log token usage if available
-        logger.debug(str(self.client.total_usage_summary))  # type: ignore
-        # Clean up reply text
-        reply = str(reply).strip()
-        return reply
+        if messages is None:
+            messages = self._oai_messages[sender]
+        reply = self.llm_client.create(self._oai_system_message + messages)
+        return reply.strip()
 
-    def send(
+    async def a_generate_reply(
         self,
-        message: Union[Dict, str],
-        recipient: Agent,
-        request_reply: Optional[bool] = None,
-        silent: Optional[bool] = False,
-    ) -> None:
-        super().send(message, recipient, request_reply, silent)
-        token_summary = self.client.total_usage_summary  # type: ignore
-        if token_summary:
-            # Determine token-usage key. Start with the configured model identifier
-            model_key = self.llm.model
-            # If exact key not found, try to match any summary key that starts with the model id
-            if model_key not in token_summary:
-                for key in token_summary:
-                    if key.startswith(f"{self.llm.model}"):
-                        model_key = key
-                        break
-            # Next, fallback to custom model name
-            if model_key not in token_summary and getattr(self.llm, "name", None) in token_summary:
-                model_key = self.llm.name
-            # If still not found, log a warning and skip
-            if model_key not in token_summary:
-                available = list(token_summary.keys())
-                logger.warning(
-                    f"Token usage summary keys {available} do not include model '{self.llm.model}' or name '{getattr(self.llm, 'name', None)}'"
-                )
-                return
-            usage = token_summary[model_key]
-            logger.info(
-                f"Previous tokens: {usage.get('prompt_tokens')} | New tokens: {usage.get('completion_tokens')} | Total tokens: {usage.get('total_tokens')}"
-            )
+        messages: Optional[List[Dict[str, Any]]] = None,
+        sender: Optional[Union["Agent", None]] = None,
+        **kwargs: Any,
+    ) -> Union[str, Dict, None]:
+        """
+        Generate a reply without blocking the event loop (async execution mode).
+        """
+        if messages is None:
+            messages = self._oai_messages[sender]
+        reply = await self.llm_client.a_create(self._oai_system_message + messages)
+        return reply.strip()
 
     def __hash__(self) -> int:
         return hash(self.name)
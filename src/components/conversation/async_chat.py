@@ -0,0 +1,88 @@
+import random
+from dataclasses import dataclass
+
+from autogen import Agent
+from itakello_logging import ItakelloLogging
+
+from ..llm.llm import LLM
+from ..llm.resilience import Resilience
+from .agent import CustomAgent
+from .chat import Chat
+from .lockstep_barrier import LockstepBarrier
+from .speaker_selector import SpeakerSelector
+from .stop_condition import StopCondition
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class AsyncChat(Chat):
+
+    def __init__(
+        self,
+        agents: list[CustomAgent],
+        llm: LLM,
+        selection_method: str = "auto",
+        round_number: int = 10,
+        barrier: LockstepBarrier | None = None,
+        resilience: Resilience | None = None,
+        speaker_selector: SpeakerSelector | None = None,
+        stop_conditions: list[StopCondition] | None = None,
+    ) -> None:
+        assert selection_method != "manual", logger.error(
+            "Manual speaker selection is not available in async mode"
+        )
+        super().__init__(
+            agents=agents,
+            llm=llm,
+            selection_method=selection_method,
+            round_number=round_number,
+            resilience=resilience,
+            speaker_selector=speaker_selector,
+            stop_conditions=stop_conditions,
+        )
+        self.barrier = barrier
+
+    async def a_run(self, message: str, sender: Agent) -> None:
+        self.reset()
+        self.append({"content": message, "role": "user"}, sender)
+        speaker = sender
+        for _ in range(self.max_round - 1):
+            speaker = await self.a_step(speaker)
+            if await self.a_check_stop():
+                break
+
+    async def a_step(self, last_speaker: Agent) -> CustomAgent:
+        if self.barrier is not None and self.speaker_selection_method == "auto":
+            await self.barrier.wait()
+        speaker = await self.a_select_speaker(last_speaker)
+        if self.barrier is not None:
+            await self.barrier.wait()
+        reply = await speaker.a_generate_reply(
+            messages=self.get_agent_messages(speaker)
+        )
+        self.append({"content": reply, "role": "assistant"}, speaker)
+        return speaker
+
+    async def a_select_speaker(self, last_speaker: Agent) -> CustomAgent:
+        if self.speaker_selection_method == "round_robin":
+            return self.next_agent(last_speaker)  # type: ignore
+        candidates = [agent for agent in self.agents if agent != last_speaker]
+        if self.speaker_selection_method == "random":
+            return random.choice(candidates or self.agents)  # type: ignore
+        return await self.speaker_selector.a_select(self, last_speaker)
+
+    def get_agent_messages(self, agent: Agent) -> list[dict]:
+        messages = []
+        for message in self.messages:
+            if message["name"] == agent.name:
+                messages.append({"content": message["content"], "role": "assistant"})
+            else:
+                messages.append(
+                    {
+                        "content": message["content"],
+                        "role": "user",
+                        "name": message["name"],
+                    }
+                )
+        return messages
@@ -1,10 +1,15 @@
 from dataclasses import dataclass
-from typing import cast
+from typing import Callable, cast
 
-from autogen import Agent, GroupChat
+from autogen import Agent, ConversableAgent, GroupChat
 from itakello_logging import ItakelloLogging
 
+from ..llm.llm import LLM
+from ..llm.llm_client import Completion, LLMClient
+from ..llm.resilience import Resilience
 from .agent import CustomAgent
+from .speaker_selector import LLMSpeakerSelector, SpeakerSelector
+from .stop_condition import StopCondition
 
 logger = ItakelloLogging().get_logger(__name__)
 
@@ -15,8 +20,12 @@ class Chat(GroupChat):
     def __init__(
         self,
         agents: list[CustomAgent],
+        llm: LLM,
         selection_method: str = "auto",
         round_number: int = 10,
+        resilience: Resilience | None = None,
+        speaker_selector: SpeakerSelector | None = None,
+        stop_conditions: list[StopCondition] | None = None,
     ) -> None:
         assert selection_method in (
             "auto",
@@ -31,6 +40,80 @@ class Chat(GroupChat):
             allow_repeat_speaker=False,
             max_round=round_number,
         )
+        self.on_append: Callable[[dict, Completion | None], None] | None = None
+        # The completion behind each message, None for the starting one
+        self.completions: list[Completion | None] = []
+        # Replaces the autogen LLM selection in auto mode, through an LLMClient
+        self.speaker_selector = speaker_selector or LLMSpeakerSelector(
+            llm_client=LLMClient(llm=llm, resilience=resilience or Resilience())
+        )
+        self.stop_conditions = stop_conditions or []
+        self.stop_reason: str | None = None
+        self.stop_turn = 0
+        self.last_checked: dict | None = None
         logger.debug(
             f"GroupChat created with {len(agents)} agents.\nSelection method: {selection_method}\nRounds number: {round_number}"
         )
+
+    @property
+    def clients(self) -> list[LLMClient]:
+        clients = self.speaker_selector.clients
+        for condition in self.stop_conditions:
+            clients = clients + condition.clients
+        return clients
+
+    def check_stop(self, message: dict | None = None) -> bool:
+        # Used by the manager as termination check, after every turn
+        if self._needs_check():
+            for condition in self.stop_conditions:
+                reason = condition.check(self.messages)
+                if reason is not None:
+                    self._stop(reason)
+                    break
+        return self.stop_reason is not None
+
+    async def a_check_stop(self) -> bool:
+        if self._needs_check():
+            for condition in self.stop_conditions:
+                reason = await condition.a_check(self.messages)
+                if reason is not None:
+                    self._stop(reason)
+                    break
+        return self.stop_reason is not None
+
+    def _needs_check(self) -> bool:
+        # The starting message is not a turn, and each turn is checked once
+        if (
+            not self.stop_conditions
+            or self.stop_reason is not None
+            or len(self.messages) < 2
+            or self.messages[-1] is self.last_checked
+        ):
+            return False
+        self.last_checked = self.messages[-1]
+        return True
+
+    def _stop(self, reason: str) -> None:
+        self.stop_reason = reason
+        self.stop_turn = len(self.messages) - 1
+        logger.info(f"Conversation stopped at turn {self.stop_turn}: {reason}")
+
+    def select_speaker(self, last_speaker: Agent, selector: ConversableAgent) -> Agent:
+        if self.speaker_selection_method == "auto":
+            return self.speaker_selector.select(self, last_speaker)
+        return super().select_speaker(last_speaker, selector)
+
+    def reset(self) -> None:
+        super().reset()
+        # In place, as the manager shares the list through its shallow copy
+        self.completions.clear()
+
+    def append(self, message: dict, speaker: Agent) -> None:
+        super().append(message, speaker)
+        completion = None
+        if isinstance(speaker, CustomAgent):
+            completion = speaker.llm_client.last_completion
+            speaker.llm_client.last_completion = None
+        self.completions.append(completion)
+        if self.on_append is not None:
+            self.on_append(self.messages[-1], completion)
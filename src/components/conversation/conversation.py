@@ -1,19 +1,32 @@
+import asyncio
 from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Callable
 
 from bson.objectid import ObjectId
 from itakello_logging import ItakelloLogging
 
 from ...interfaces.mongo_model import MongoModel
 from ...utility.consts import TIME_FORMAT
+from ...utility.enums import ConversationStatus, StreamMode
+from ..conversation.async_chat import AsyncChat
 from ..conversation.chat import Chat
+from ..conversation.lockstep_barrier import LockstepBarrier
 from ..conversation.manager import Manager
 from ..conversation.researcher import Researcher
 from ..experiment.experiment import Experiment
+from ..llm.context_budget import ContextBudget
 from ..llm.llm import LLM
+from ..llm.llm_client import Completion, LLMClient
+from ..llm.resilience import Resilience
+from ..llm.response_cache import ResponseCache
+from ..llm.tokens import count_tokens
+from ..llm.usage import Usage
 from ..section.section import Section
 from .agent import CustomAgent
 from .message import Message
+from .speaker_selector import SpeakerSelector
+from .stop_condition import StopCondition
 from .summarizer import Summarizer
 
 logger = ItakelloLogging().get_logger(__name__)
@@ -29,9 +42,22 @@ class Conversation(MongoModel):
     agent_combination: list[tuple[str, int]]
     creator: str
     favourite: bool = False
+    experiment_id: ObjectId | None = None
     id: ObjectId = field(default_factory=ObjectId)
     creation_date: datetime = field(default_factory=datetime.now)
     messages_ids: list[ObjectId] = field(default_factory=list)
+    status: ConversationStatus = ConversationStatus.IN_PROGRESS
+    completed_days: int = 0
+    summaries: list[str] = field(default_factory=list)
+    agent_names: list[str] = field(default_factory=list)
+    # Every LLM request made for the conversation, summaries included
+    usage: Usage = field(default_factory=Usage)
+    # Summaries of the first days merged into one, with a context budget
+    compacted_summary: str = ""
+    compacted_days: int = 0
+    # Set when a stop condition ends the conversation before its last day
+    stop_reason: str = ""
+    stop_turn: int = 0
 
     def __post_init__(self) -> None:
         logger.debug(f"Created a new Conversation:\n{self}")
@@ -44,6 +70,7 @@ class Conversation(MongoModel):
             + f"- starting message: {self.starting_message}\n"
             + f"- creator: {self.creator}\n"
             + f"- favourite: {self.favourite}\n"
+            + f"- status: {self.status.value}\n"
             + f"- messages: {self.messages_ids}\n"
         )
         return output
@@ -52,6 +79,10 @@ class Conversation(MongoModel):
         self,
         experiment: Experiment,
         placeholders: dict[str, str],
+        name_seed: str = "",
+        cache: ResponseCache | None = None,
+        resilience: Resilience | None = None,
+        stream: StreamMode = StreamMode.OFF,
     ) -> list[CustomAgent]:
         agents = []
         # full_roles = [f"{role.capitalize()}:" for role, _ in self.agent_combination]
@@ -65,50 +96,265 @@ class Conversation(MongoModel):
                         sections=list(experiment.shared_sections.values())
                         + list(experiment.roles[role].sections.values()),
                         llm=self.llm,
+                        agent_name=(
+                            self.agent_names[len(agents)] if self.agent_names else ""
+                        ),
+                        name_seed=f"{name_seed}|{len(agents)}" if name_seed else "",
+                        cache=cache,
+                        resilience=resilience,
+                        stream=stream,
+                        limits=experiment.roles[role].get_limits(
+                            [
+                                other
+                                for other, _ in self.agent_combination
+                                if other != role
+                            ]
+                        ),
                     )
                 )
+        self.agent_names = [agent.name for agent in agents]
         return agents
 
     def perform(
-        self, agents: list[CustomAgent], summarizer: Summarizer, llm_manager: LLM
+        self,
+        agents: list[CustomAgent],
+        summarizer: Summarizer,
+        llm_manager: LLM,
+        on_flush: Callable[["Conversation", list[Message]], None] | None = None,
+        flush_every_turn: bool = False,
+        resilience: Resilience | None = None,
+        context_budget: ContextBudget | None = None,
+        speaker_selector: SpeakerSelector | None = None,
+        stop_conditions: list[StopCondition] | None = None,
     ) -> list[Message]:
-        start_message = self.starting_message
+        llm_manager.provision()
         researcher = Researcher()
         group_chat = Chat(
             agents=agents,
+            llm=llm_manager,
             selection_method=self.speaker_selection_method,
             round_number=self.n_messages // self.days,
+            resilience=resilience,
+            speaker_selector=speaker_selector,
+            stop_conditions=stop_conditions,
+        )
+        self._configure_clients(
+            [agent.llm_client for agent in agents] + group_chat.clients,
+            summarizer,
+            context_budget,
         )
-        manager = Manager(groupchat=group_chat, llm_config=llm_manager.config)
+        day_messages: list[Message] = []
+        # The manager keeps a shallow copy of the chat: hooks must be set before it
+        self._set_turn_flush(group_chat, day_messages, on_flush, flush_every_turn)
+        manager = Manager(groupchat=group_chat, llm_config=llm_manager.llm_config)
         messages = []
-        for i in range(int(self.days)):
+        for day in range(self.completed_days + 1, int(self.days) + 1):
+            day_messages.clear()
+            if context_budget is not None and self._needs_compaction(context_budget):
+                self._set_compacted_summary(
+                    summarizer.compact_summaries(
+                        self.compacted_summary, self.summaries[self.compacted_days : -1]
+                    )
+                )
             researcher.initiate_chat(
-                recipient=manager, clear_history=True, message=start_message
+                recipient=manager,
+                clear_history=True,
+                message=self._get_start_message(),
             )
-            raw_conversation = group_chat.messages
+            if group_chat.stop_reason is not None:
+                messages.extend(
+                    self._stop_early(group_chat, day_messages, day, on_flush)
+                )
+                break
             summary = summarizer.generate_summary(
-                previous_conversation=raw_conversation[1:], round_number=i + 1
+                previous_conversation=group_chat.messages[1:], round_number=day
+            )
+            messages.extend(
+                self._complete_day(group_chat, day_messages, summary, day, on_flush)
+            )
+        logger.confirmation("Conversation complete")
+        return messages
+
+    async def a_perform(
+        self,
+        agents: list[CustomAgent],
+        summarizer: Summarizer,
+        llm_manager: LLM,
+        on_flush: Callable[["Conversation", list[Message]], None] | None = None,
+        flush_every_turn: bool = False,
+        barrier: LockstepBarrier | None = None,
+        resilience: Resilience | None = None,
+        context_budget: ContextBudget | None = None,
+        speaker_selector: SpeakerSelector | None = None,
+        stop_conditions: list[StopCondition] | None = None,
+    ) -> list[Message]:
+        if not llm_manager.provisioned:
+            await asyncio.to_thread(llm_manager.provision)
+        researcher = Researcher()
+        group_chat = AsyncChat(
+            agents=agents,
+            llm=llm_manager,
+            selection_method=self.speaker_selection_method,
+            round_number=self.n_messages // self.days,
+            barrier=barrier,
+            resilience=resilience,
+            speaker_selector=speaker_selector,
+            stop_conditions=stop_conditions,
+        )
+        self._configure_clients(
+            [agent.llm_client for agent in agents] + group_chat.clients,
+            summarizer,
+            context_budget,
+        )
+        messages = []
+        day_messages: list[Message] = []
+        self._set_turn_flush(group_chat, day_messages, on_flush, flush_every_turn)
+        for day in range(self.completed_days + 1, int(self.days) + 1):
+            day_messages.clear()
+            if context_budget is not None and self._needs_compaction(context_budget):
+                self._set_compacted_summary(
+                    await summarizer.a_compact_summaries(
+                        self.compacted_summary, self.summaries[self.compacted_days : -1]
+                    )
+                )
+            await group_chat.a_run(message=self._get_start_message(), sender=researcher)
+            if group_chat.stop_reason is not None:
+                messages.extend(
+                    self._stop_early(group_chat, day_messages, day, on_flush)
+                )
+                break
+            summary = await summarizer.a_generate_summary(
+                previous_conversation=group_chat.messages[1:], round_number=day
+            )
+            messages.extend(
+                self._complete_day(group_chat, day_messages, summary, day, on_flush)
             )
-            start_message += "\n" + summary
-            new_messages = self.add_daily_conversation(raw_conversation, day=i + 1)
-            messages.extend(new_messages)
-        self.messages_ids = [message.id for message in messages]
         logger.confirmation("Conversation complete")
         return messages
 
+    def _configure_clients(
+        self,
+        clients: list[LLMClient],
+        summarizer: Summarizer,
+        context_budget: ContextBudget | None,
+    ) -> None:
+        for client in clients:
+            client.context_budget = context_budget
+        for client in clients + [summarizer.llm_client]:
+            client.usage = self.usage
+        summarizer.context_budget = context_budget
+
+    def _get_start_message(self) -> str:
+        compacted = [self.compacted_summary] if self.compacted_summary else []
+        return "\n".join(
+            [self.starting_message] + compacted + self.summaries[self.compacted_days :]
+        )
+
+    def _needs_compaction(self, context_budget: ContextBudget) -> bool:
+        # The summary of the last day is always kept as it is
+        if len(self.summaries) - self.compacted_days < 2:
+            return False
+        summaries = [self.compacted_summary] + self.summaries[self.compacted_days :]
+        return count_tokens("\n".join(summaries)) > context_budget.summary_tokens
+
+    def _set_compacted_summary(self, compacted_summary: str) -> None:
+        self.compacted_days = len(self.summaries) - 1
+        self.compacted_summary = (
+            f"Days 1-{self.compacted_days} summary:\n {compacted_summary}"
+        )
+        logger.debug(f"Summaries of days 1-{self.compacted_days} compacted")
+
+    def _set_turn_flush(
+        self,
+        group_chat: Chat,
+        day_messages: list[Message],
+        on_flush: Callable[["Conversation", list[Message]], None] | None,
+        flush_every_turn: bool,
+    ) -> None:
+        if on_flush is not None and flush_every_turn:
+            group_chat.on_append = lambda raw_message, completion: on_flush(
+                self, self.add_daily_message(raw_message, completion, day_messages)
+            )
+
+    def _stop_early(
+        self,
+        group_chat: Chat,
+        day_messages: list[Message],
+        day: int,
+        on_flush: Callable[["Conversation", list[Message]], None] | None,
+    ) -> list[Message]:
+        # The outcome is reached: no summary and no further days
+        self.stop_reason = group_chat.stop_reason or ""
+        self.stop_turn = group_chat.stop_turn
+        return self._complete_day(group_chat, day_messages, None, day, on_flush)
+
+    def _complete_day(
+        self,
+        group_chat: Chat,
+        day_messages: list[Message],
+        summary: str | None,
+        day: int,
+        on_flush: Callable[["Conversation", list[Message]], None] | None,
+    ) -> list[Message]:
+        if group_chat.on_append is not None:
+            new_messages = []
+            completed_messages = list(day_messages)
+        else:
+            new_messages = self.add_daily_conversation(
+                group_chat.messages, group_chat.completions, day=day
+            )
+            completed_messages = new_messages
+        if summary is not None:
+            self.summaries.append(summary)
+        self.completed_days = day
+        if day == self.days or self.stop_reason:
+            self.status = ConversationStatus.COMPLETED
+        if on_flush is not None:
+            on_flush(self, new_messages)
+        return completed_messages
+
     def to_selection(self) -> str:
+        return self.summary_to_selection(self.to_summary())
+
+    def to_summary(self) -> dict:
+        # Same fields as the listing query of the DatabaseManager
+        return {
+            "_id": self.id,
+            "n_messages": self.n_messages,
+            "creator": self.creator,
+            "creation_date": self.creation_date,
+            "speaker_selection_method": self.speaker_selection_method,
+            "days": self.days,
+            "llm": self.llm.to_document(),
+            "agent_combination": self.agent_combination,
+            "status": self.status.value,
+            "completed_days": self.completed_days,
+            "stop_reason": self.stop_reason,
+            "favourite": self.favourite,
+        }
+
+    @classmethod
+    def summary_to_selection(cls, summary: dict) -> str:
         agent_combinations = ", ".join(
-            f"{role.capitalize()}:{num}" for role, num in self.agent_combination
+            f"{role.capitalize()}:{num}" for role, num in summary["agent_combination"]
         )
         selection = (
-            f"Number of messages: {self.n_messages}\t"
-            + f"Creator: {self.creator}  [{self.creation_date.strftime(TIME_FORMAT)}]\t"
-            + f"Speaker selection method: {self.speaker_selection_method}\t"
-            + f"Days: {self.days}\t"
-            + f"LLM: {self.llm}\t"
+            f"Number of messages: {summary['n_messages']}\t"
+            + f"Creator: {summary['creator']}  [{summary['creation_date'].strftime(TIME_FORMAT)}]\t"
+            + f"Speaker selection method: {summary['speaker_selection_method']}\t"
+            + f"Days: {summary['days']}\t"
+            + f"LLM: {LLM.from_document(summary['llm'])}\t"
             + f"Agent combination: {agent_combinations}\t"
         )
-        if self.favourite:
+        completed_days = summary.get("completed_days", summary["days"])
+        if (
+            summary.get("status", ConversationStatus.COMPLETED.value)
+            == ConversationStatus.IN_PROGRESS.value
+        ):
+            selection += f" [in progress: {completed_days}/{summary['days']} days]"
+        elif summary.get("stop_reason"):
+            selection += f" [stopped on day {completed_days}]"
+        if summary["favourite"]:
             selection += " ⭐"
         return selection
 
@@ -120,27 +366,61 @@ class Conversation(MongoModel):
             + f"\033[1mStarting message\033[0m: {self.starting_message}\n\n"
             + f"\033[1mCreator\033[0m: {self.creator}\n\n"
             + f"\033[1mFavourite\033[0m: {self.favourite}\n\n"
+            + f"\033[1mStatus\033[0m: {self.status.value} ({self.completed_days}/{self.days} days)\n\n"
             + f"\033[1mNum messages\033[0m: {len(self.messages_ids)}\n\n"
+            + f"\033[1mUsage\033[0m: {self.usage}\n\n"
         )
+        if self.stop_reason:
+            output += f"\033[1mStopped\033[0m: day {self.completed_days}, turn {self.stop_turn} ({self.stop_reason})\n\n"
         return output
 
     def add_daily_conversation(
-        self, raw_conversation: list[dict], day: int
+        self,
+        raw_conversation: list[dict],
+        completions: list[Completion | None],
+        day: int,
     ) -> list[Message]:
-        messages = []
-        for i, message in enumerate(raw_conversation):
-            messages.append(
-                Message(
-                    index=i,
-                    day=day,
-                    role=message["name"].split("_")[0],
-                    speaker=message["name"],
-                    content=message["content"],
-                )
+        messages = [
+            self._create_message(i, day, message, completion)
+            for i, (message, completion) in enumerate(
+                zip(raw_conversation, completions)
             )
-        self.messages_ids.extend(messages)
+        ]
+        self.messages_ids.extend(message.id for message in messages)
         return messages
 
+    def add_daily_message(
+        self,
+        raw_message: dict,
+        completion: Completion | None,
+        day_messages: list[Message],
+    ) -> list[Message]:
+        message = self._create_message(
+            len(day_messages), self.completed_days + 1, raw_message, completion
+        )
+        day_messages.append(message)
+        self.messages_ids.append(message.id)
+        return [message]
+
+    def _create_message(
+        self, index: int, day: int, raw_message: dict, completion: Completion | None
+    ) -> Message:
+        completion = completion or Completion(content=raw_message["content"])
+        return Message(
+            index=index,
+            day=day,
+            role=raw_message["name"].split("_")[0],
+            speaker=raw_message["name"],
+            content=raw_message["content"],
+            prompt_tokens=completion.prompt_tokens,
+            completion_tokens=completion.completion_tokens,
+            latency=completion.latency,
+            ttft=completion.ttft,
+            endpoint=completion.endpoint,
+            conversation_id=self.id,
+            experiment_id=self.experiment_id,
+        )
+
     @classmethod
     def from_document(cls, doc: dict) -> "Conversation":
         return cls(
@@ -153,8 +433,20 @@ class Conversation(MongoModel):
             agent_combination=doc["agent_combination"],
             creator=doc["creator"],
             favourite=doc["favourite"],
+            experiment_id=doc.get("experiment_id"),
             creation_date=doc["creation_date"],
             messages_ids=doc["messages_ids"],
+            status=ConversationStatus(
+                doc.get("status", ConversationStatus.COMPLETED.value)
+            ),
+            completed_days=doc.get("completed_days", doc["days"]),
+            summaries=doc.get("summaries", []),
+            agent_names=doc.get("agent_names", []),
+            usage=Usage.from_document(doc.get("usage", {})),
+            compacted_summary=doc.get("compacted_summary", ""),
+            compacted_days=doc.get("compacted_days", 0),
+            stop_reason=doc.get("stop_reason", ""),
+            stop_turn=doc.get("stop_turn", 0),
         )
 
     def to_document(self) -> dict:
@@ -168,6 +460,16 @@ class Conversation(MongoModel):
             "agent_combination": self.agent_combination,
             "creator": self.creator,
             "favourite": self.favourite,
+            "experiment_id": self.experiment_id,
             "creation_date": self.creation_date,
             "messages_ids": self.messages_ids,
+            "status": self.status.value,
+            "completed_days": self.completed_days,
+            "summaries": self.summaries,
+            "agent_names": self.agent_names,
+            "usage": self.usage.to_document(),
+            "compacted_summary": self.compacted_summary,
+            "compacted_days": self.compacted_days,
+            "stop_reason": self.stop_reason,
+            "stop_turn": self.stop_turn,
         }
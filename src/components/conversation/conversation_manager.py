@@ -1,19 +1,29 @@
 from dataclasses import dataclass, field
 
+from bson import ObjectId
 from itakello_logging import ItakelloLogging
 
 from ...core.database_manager import DatabaseManager
 from ...core.input_manager import InputManager
 from ...interfaces import BaseManager
-from ...utility.consts import DEV_MODE, TIME_FORMAT
+from ...utility.consts import (
+    DEFAULT_BACKEND_CONCURRENCY,
+    DEFAULT_MAX_RESIDENT_MODELS,
+    DEFAULT_WRITE_BATCH_SIZE,
+    DEFAULT_WRITE_MAX_LATENCY,
+    DEV_MODE,
+    TIME_FORMAT,
+)
 from ...utility.custom_os import CustomOS
+from ...utility.enums import SpeakerSelectorType, StreamMode
 from ..experiment.experiment import Experiment
 from ..llm.llm import LLM
 from ..llm.llm_manager import LLMManager
 from ..role.role import Role
 from ..section.section_manager import SectionManager
+from ..sweep.sweep import Sweep
+from ..sweep.sweep_executor import SweepExecutor
 from .conversation import Conversation
-from .summarizer import Summarizer
 
 logger = ItakelloLogging().get_logger(__name__)
 
@@ -39,73 +49,115 @@ class ConversationManager(BaseManager):
             available_roles=list(experiment.roles.values())
         )
         speaker_selection_method = self._ask_for_speaker_selection_method()
+        speaker_selector = (
+            self._ask_speaker_selector()
+            if speaker_selection_method == "auto"
+            else SpeakerSelectorType.LLM
+        )
 
-        total_conversations = (
-            n_conversations * len(llms) * len(days_list) * len(agent_combinations)
+        sweep = Sweep(
+            experiment_id=experiment.id,
+            n_messages=total_messages,
+            speaker_selection_method=speaker_selection_method,
+            creator=self.db_m.username,
+            use_cache=self._ask_use_cache(),
+            context_budget=self._ask_context_budget(),
+            speaker_selector=speaker_selector,
+            selector_llm=(
+                self._ask_selector_llm()
+                if speaker_selector
+                in (SpeakerSelectorType.SMALL_LLM, SpeakerSelectorType.CACHED)
+                else None
+            ),
         )
-        index_conv = 1
+        self._ask_stop_conditions(sweep)
         for llm in llms:
             for days in days_list:
                 for agent_combination in agent_combinations:
-                    for _ in range(n_conversations):
-                        logger.info(
-                            f"--- Performing conversation [{index_conv}/{total_conversations}] ---\n"
-                        )
-                        index_conv += 1
-                        conv_llm = experiment.llms[llm]
-                        logger.info(
-                            f"\033[1mLLM\033[0m: {conv_llm}\n\033[1mDays\033[0m: {days}\n\033[1mAgents\033[0m: {agent_combination}\n"
-                        )
-                        conversation = Conversation(
-                            n_messages=total_messages,
-                            speaker_selection_method=speaker_selection_method,
-                            starting_message=experiment.starting_message,
-                            creator=self.db_m.username,
+                    for replicate in range(n_conversations):
+                        sweep.add_cell(
+                            llm=llm,
                             days=days,
-                            llm=conv_llm,
                             agent_combination=agent_combination,
+                            replicate=replicate,
                         )
-                        placeholders = experiment.compose_placeholders(
-                            agent_combination
-                        )
-                        conv_agents = conversation.generate_agents(
-                            experiment, placeholders
-                        )
-                        summarizer = Summarizer(
-                            sections=list(experiment.summarizer_sections.values()),
-                            placeholders=placeholders,
-                            llm=conv_llm,
-                        )
-                        messages = conversation.perform(
-                            agents=conv_agents,
-                            summarizer=summarizer,
-                            llm_manager=conv_llm,
-                        )
-                        self.db_m.save_conversation(
-                            experiment=experiment,
-                            conversation=conversation,
-                            messages=messages,
-                        )
-        logger.confirmation(f"Performed and saved {total_conversations} conversations")
+        self.db_m.save_sweep(sweep)
+        self._run_sweep(experiment, sweep)
 
-    def select_conversation(self, experiment: Experiment) -> Conversation | None:
-        conversations = self.db_m.get_conversations(experiment.conversation_ids)
-        if not conversations:
-            return None  # type: ignore
+    def resume_sweep(self, experiment: Experiment) -> None:
+        sweeps = self.db_m.get_sweeps(experiment)
         choices = []
-        for conversation in conversations.values():
-            choices.append((conversation.to_selection(), str(conversation.id)))
+        for sweep in sweeps.values():
+            if sweep.get_remaining_cells():
+                choices.append((sweep.to_selection(), str(sweep.id)))
+        if not choices:
+            logger.warning("No unfinished sweeps available for this experiment.")
+            return
         selected_id = self.input_m.select_one(
-            message="Select a conversation to view:", choices=choices
+            message="Select a sweep to resume:", choices=choices
         )
-        return conversations[selected_id]
+        self._run_sweep(experiment, sweeps[selected_id])
+
+    def _run_sweep(self, experiment: Experiment, sweep: Sweep) -> None:
+        remaining_cells = sweep.get_remaining_cells()
+        # Backend -> number of endpoints behind it
+        backends = {
+            experiment.llms[cell.llm].backend: len(experiment.llms[cell.llm].endpoints)
+            for cell in remaining_cells
+        }
+        ollama_models = {
+            experiment.llms[cell.llm].config["model"]
+            for cell in remaining_cells
+            if experiment.llms[cell.llm].is_ollama
+        }
+        workers = self._ask_sweep_workers()
+        mode = self._ask_sweep_mode() if workers > 1 else "thread"
+        write_batch_size, write_max_latency = self._ask_write_batch()
+        executor = SweepExecutor(
+            db_m=self.db_m,
+            workers=workers,
+            mode=mode,
+            backend_limits=self._ask_backend_limits(backends) if workers > 1 else {},
+            flush_every_turn=self._ask_flush_every_turn(),
+            lockstep=self._ask_lockstep() if mode == "async" else False,
+            max_resident_models=(
+                self._ask_max_resident_models()
+                if len(ollama_models) > 1
+                else DEFAULT_MAX_RESIDENT_MODELS
+            ),
+            stream=self._ask_stream(workers),
+            write_batch_size=write_batch_size,
+            write_max_latency=write_max_latency,
+        )
+        completed = executor.run(experiment, sweep)
+        logger.confirmation(
+            f"Performed and saved {completed}/{len(remaining_cells)} conversations"
+        )
+
+    def select_conversation(self, experiment: Experiment) -> Conversation | None:
+        def get_choices(skip: int, limit: int) -> tuple[list[tuple[str, str]], int]:
+            summaries, total = self.db_m.get_conversation_summaries(
+                experiment, skip, limit
+            )
+            choices = [
+                (Conversation.summary_to_selection(summary), str(summary["_id"]))
+                for summary in summaries
+            ]
+            return choices, total
+
+        selected_id = self.input_m.select_page(
+            message="Select a conversation to view:", get_choices=get_choices
+        )
+        if selected_id is None:
+            return None
+        return self.db_m.get_conversation(ObjectId(selected_id))
 
     def toggle_favourite(self, conversation: Conversation) -> None:
         conversation.favourite = not conversation.favourite
         self.db_m.update_conversation(conversation)
 
     def view_conversation(self, conversation: Conversation) -> None:
-        messages = self.db_m.get_messages(conversation.messages_ids)
+        messages = self.db_m.iter_messages(conversation.id, fields=[])
         roles = [role for role, _ in conversation.agent_combination]
         color_codes = {
             "\033[93m",  # Yellow
@@ -119,11 +171,18 @@ class ConversationManager(BaseManager):
         agent_colors = {"Researcher": "\033[94m"}  # Blue
         for role in roles:
             agent_colors[role.capitalize()] = color_codes.pop()
-        for message in messages.values():
+        for message in messages:
             color_code = agent_colors.get(message.role, "\033[0m")
             logger.info(
                 f"{color_code}[Day {message.day}] {message.speaker}\033[0m:\n{message.content}\n"
             )
+        logger.info(f"\033[1mUsage\033[0m: {conversation.usage}")
+        for group_by in ("role", "day"):
+            usage = self.db_m.get_message_usage(
+                {"conversation_id": conversation.id}, group_by
+            )
+            for group, group_usage in usage.items():
+                logger.info(f"- {group_by.capitalize()} {group}: {group_usage}")
 
     def delete_conversation(
         self, experiment: Experiment, conversation: Conversation
@@ -157,6 +216,82 @@ class ConversationManager(BaseManager):
             )
         return speaker_selection_method
 
+    def _ask_speaker_selector(self) -> SpeakerSelectorType:
+        choices = [
+            (
+                "Conversation LLM: the conversation model selects the next speaker",
+                SpeakerSelectorType.LLM.value,
+            ),
+            (
+                "Small LLM: a separate, smaller model selects the next speaker",
+                SpeakerSelectorType.SMALL_LLM.value,
+            ),
+            (
+                "Rules: the addressed agent, otherwise the longest silent one of another role",
+                SpeakerSelectorType.RULES.value,
+            ),
+            (
+                "Cached: LLM decisions are reused for the same recent speakers and mentions",
+                SpeakerSelectorType.CACHED.value,
+            ),
+        ]
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            speaker_selector = CustomOS.getenv(
+                "SPEAKER_SELECTOR", SpeakerSelectorType.LLM.value
+            )
+        else:
+            speaker_selector = self.input_m.select_one(
+                message="Select how the next speaker is selected in auto mode",
+                choices=choices,
+            )
+        return SpeakerSelectorType(speaker_selector)
+
+    def _ask_selector_llm(self) -> LLM | None:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            model = CustomOS.getenv("SELECTOR_LLM", "")
+        else:
+            model = self.input_m.input_str(
+                "Enter the LLM selecting the speakers (empty for the one of the experiment)",
+                optional=True,
+            )
+        return LLM(model=model) if model else None
+
+    def _ask_stop_conditions(self, sweep: Sweep) -> None:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            stop_patterns = CustomOS.getenv("STOP_PATTERNS", "")
+            sweep.stop_patterns = stop_patterns.split(",") if stop_patterns else []
+            sweep.stop_judge = CustomOS.getenv("STOP_JUDGE", "")
+            judge_model = CustomOS.getenv("JUDGE_LLM", "")
+        else:
+            if not self.input_m.confirm(
+                "Do you want to stop the conversations once they reach an outcome?"
+            ):
+                return
+            logger.instruction(
+                instructions=[
+                    "A conversation stops when a message matches one of the regular expressions (case insensitive)",
+                    "Or when the judge LLM, asked after every turn, confirms the described outcome",
+                ]
+            )
+            sweep.stop_patterns = self.input_m.input_list(
+                message="Enter the regular expressions ending a conversation",
+                example="escape granted, yard time (agreed|refused)",
+                optional=True,
+            )
+            sweep.stop_judge = self.input_m.input_str(
+                "Describe the outcome checked by the judge (empty for none)",
+                optional=True,
+            )
+            judge_model = (
+                self.input_m.input_str(
+                    "Enter the judge LLM (empty for the conversation one)",
+                    optional=True,
+                )
+                if sweep.stop_judge
+                else ""
+            )
+        sweep.judge_llm = LLM(model=judge_model) if judge_model else None
+
     def _ask_n_conversations(self) -> int:
         if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
             n_conversations = CustomOS.getenv("N_CONVERSATIONS")
@@ -168,6 +303,166 @@ class ConversationManager(BaseManager):
             )
         return n_conversations
 
+    def _ask_use_cache(self) -> bool:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            use_cache = CustomOS.getenv("RESPONSE_CACHE", "n") == "y"
+        else:
+            use_cache = self.input_m.confirm(
+                "Do you want to reuse cached LLM responses? Identical prompts will replay the stored replies"
+            )
+        return use_cache
+
+    def _ask_context_budget(self) -> int:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            context_budget = int(CustomOS.getenv("CONTEXT_BUDGET", "0"))
+        else:
+            logger.instruction(
+                instructions=[
+                    "With a context budget each request keeps the prompts, the most recent turns and a compacted summary of the previous days",
+                    "Prompt size and latency then stay flat as the number of days grows",
+                ]
+            )
+            context_budget = self.input_m.input_int(
+                "Enter the maximum number of prompt tokens per request (0 to send the whole history)",
+                default="0",
+            )
+        return context_budget
+
+    def _ask_sweep_workers(self) -> int:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            workers = int(CustomOS.getenv("SWEEP_WORKERS", "1"))
+        else:
+            workers = self.input_m.input_int(
+                "Enter the number of conversations to perform in parallel",
+                positive_requirement=True,
+                default="1",
+            )
+        return workers
+
+    def _ask_sweep_mode(self) -> str:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            mode = CustomOS.getenv("SWEEP_MODE", "thread")
+        else:
+            mode = self.input_m.select_one(
+                message="Select how the parallel conversations are executed",
+                choices=[
+                    ("Threads: conversations share the process", "thread"),
+                    ("Processes: each worker runs in its own process", "process"),
+                    (
+                        "Async: conversations run as coroutines on a single event loop",
+                        "async",
+                    ),
+                ],
+            )
+        return mode
+
+    def _ask_lockstep(self) -> bool:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            lockstep = CustomOS.getenv("LOCKSTEP", "n") == "y"
+        else:
+            logger.instruction(
+                instructions=[
+                    "In lockstep mode the replicates of the same LLM, days and agent combination advance one turn at a time and their prompts are sent together",
+                    "Set OLLAMA_NUM_PARALLEL on the Ollama server to at least the number of replicates so the batch is served in parallel",
+                ]
+            )
+            lockstep = self.input_m.confirm(
+                "Do you want to run the replicates of each hyperparameter set in lockstep?"
+            )
+        return lockstep
+
+    def _ask_flush_every_turn(self) -> bool:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            flush_every_turn = CustomOS.getenv("FLUSH_EVERY_TURN", "n") == "y"
+        else:
+            flush_every_turn = self.input_m.confirm(
+                "Do you want to save the messages after every turn? Otherwise they are saved at the end of each day"
+            )
+        return flush_every_turn
+
+    def _ask_stream(self, workers: int) -> StreamMode:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            stream = StreamMode(CustomOS.getenv("STREAM_MODE", StreamMode.OFF.value))
+        else:
+            choices = [
+                ("No streaming", StreamMode.OFF.value),
+                (
+                    "Stream the replies to measure the time to first token",
+                    StreamMode.METRICS.value,
+                ),
+            ]
+            # Parallel conversations would interleave on the console
+            if workers == 1:
+                choices.append(
+                    (
+                        "Stream the replies and show them live in the console",
+                        StreamMode.LIVE.value,
+                    )
+                )
+            stream = StreamMode(
+                self.input_m.select_one(
+                    message="Select whether the replies are streamed",
+                    choices=choices,
+                )
+            )
+        return stream
+
+    def _ask_write_batch(self) -> tuple[int, float]:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            write_batch_size = int(
+                CustomOS.getenv("WRITE_BATCH_SIZE", str(DEFAULT_WRITE_BATCH_SIZE))
+            )
+            write_max_latency = float(
+                CustomOS.getenv("WRITE_MAX_LATENCY", str(DEFAULT_WRITE_MAX_LATENCY))
+            )
+        else:
+            logger.instruction(
+                instructions=[
+                    "The saved days and conversations are written to the database in batches",
+                    "A batch is written once it is full or its oldest write has waited long enough",
+                ]
+            )
+            write_batch_size = self.input_m.input_int(
+                "Enter the number of saves per batch (1 to write them right away)",
+                positive_requirement=True,
+                default=str(DEFAULT_WRITE_BATCH_SIZE),
+            )
+            write_max_latency = self.input_m.input_float(
+                "Enter the maximum number of seconds a save can wait in the batch",
+                positive_requirement=True,
+                default=str(DEFAULT_WRITE_MAX_LATENCY),
+            )
+        return write_batch_size, write_max_latency
+
+    def _ask_max_resident_models(self) -> int:
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            max_resident_models = int(
+                CustomOS.getenv("MAX_RESIDENT_MODELS", str(DEFAULT_MAX_RESIDENT_MODELS))
+            )
+        else:
+            max_resident_models = self.input_m.input_int(
+                "Enter the maximum number of Ollama models kept in memory at the same time (the conversations are grouped by model and the next model is loaded in advance if there is room)",
+                positive_requirement=True,
+                default=str(DEFAULT_MAX_RESIDENT_MODELS),
+            )
+        return max_resident_models
+
+    def _ask_backend_limits(self, backends: dict[str, int]) -> dict[str, int]:
+        backend_limits = {}
+        if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
+            for pair in CustomOS.getenv("BACKEND_CONCURRENCY", "").split(","):
+                if "=" in pair:
+                    backend, limit = pair.rsplit("=", 1)
+                    backend_limits[backend.strip()] = int(limit)
+        else:
+            for backend, n_endpoints in sorted(backends.items()):
+                backend_limits[backend] = self.input_m.input_int(
+                    f"Enter the maximum number of concurrent conversations on [{backend}]",
+                    positive_requirement=True,
+                    default=str(DEFAULT_BACKEND_CONCURRENCY * n_endpoints),
+                )
+        return backend_limits
+
     def _ask_llms(self, available_llms: list[LLM]) -> list[str]:
         if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
             llms = CustomOS.getenv("LLMS").split(",")
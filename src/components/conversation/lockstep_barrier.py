@@ -0,0 +1,37 @@
+import asyncio
+from dataclasses import dataclass, field
+
+from itakello_logging import ItakelloLogging
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class LockstepBarrier:
+    name: str
+    parties: int = field(default=0, init=False)
+    arrived: int = field(default=0, init=False)
+    event: asyncio.Event = field(default_factory=asyncio.Event, init=False)
+
+    def join(self) -> None:
+        self.parties += 1
+
+    def leave(self) -> None:
+        self.parties -= 1
+        if self.parties > 0 and self.arrived >= self.parties:
+            self._release()
+
+    async def wait(self) -> None:
+        self.arrived += 1
+        if self.arrived >= self.parties:
+            self._release()
+            return
+        await self.event.wait()
+
+    def _release(self) -> None:
+        logger.debug(
+            f"Lockstep [{self.name}]: releasing a batch of {self.arrived} turns"
+        )
+        self.event.set()
+        self.event = asyncio.Event()
+        self.arrived = 0
@@ -11,7 +11,11 @@ logger = ItakelloLogging().get_logger(__name__)
 @dataclass
 class Manager(autogen.GroupChatManager):
     def __init__(self, groupchat: Chat, llm_config: dict) -> None:
-        super().__init__(groupchat=groupchat, llm_config=llm_config)
+        super().__init__(
+            groupchat=groupchat,
+            llm_config=llm_config,
+            is_termination_msg=groupchat.check_stop,
+        )
         logger.debug("Manager created")
 
     def __hash__(self) -> int:
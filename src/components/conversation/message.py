@@ -12,23 +12,47 @@ class Message(MongoModel):
     role: str
     speaker: str
     content: str
-    id: ObjectId = field(init=False, default_factory=ObjectId)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+    ttft: float = 0.0
+    endpoint: str = ""
+    # Copied from the conversation, so a transcript is a single indexed query
+    conversation_id: ObjectId | None = None
+    experiment_id: ObjectId | None = None
+    id: ObjectId = field(default_factory=ObjectId)
 
     @classmethod
     def from_document(cls, doc: dict) -> "Message":
         return cls(
+            id=doc["_id"],
             index=doc["index"],
             day=doc["day"],
             role=doc["role"],
             speaker=doc["speaker"],
             content=doc["content"],
+            prompt_tokens=doc.get("prompt_tokens", 0),
+            completion_tokens=doc.get("completion_tokens", 0),
+            latency=doc.get("latency", 0.0),
+            ttft=doc.get("ttft", 0.0),
+            endpoint=doc.get("endpoint", ""),
+            conversation_id=doc.get("conversation_id"),
+            experiment_id=doc.get("experiment_id"),
         )
 
     def to_document(self) -> dict:
         return {
+            "_id": self.id,
             "index": self.index,
             "day": self.day,
             "role": self.role,
             "speaker": self.speaker,
             "content": self.content,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency": self.latency,
+            "ttft": self.ttft,
+            "endpoint": self.endpoint,
+            "conversation_id": self.conversation_id,
+            "experiment_id": self.experiment_id,
         }
@@ -0,0 +1,151 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from autogen import Agent
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import SPEAKER_CACHE_WINDOW
+from ..llm.llm_client import LLMClient
+
+if TYPE_CHECKING:
+    from .chat import Chat
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+class SpeakerSelector(ABC):
+
+    @property
+    def clients(self) -> list[LLMClient]:
+        return []
+
+    @abstractmethod
+    def select(self, chat: "Chat", last_speaker: Agent) -> Agent:
+        pass
+
+    async def a_select(self, chat: "Chat", last_speaker: Agent) -> Agent:
+        return self.select(chat, last_speaker)
+
+    def _get_candidates(self, chat: "Chat", last_speaker: Agent) -> list[Agent]:
+        return [agent for agent in chat.agents if agent != last_speaker] or chat.agents
+
+    def _get_mentioned(self, chat: "Chat", candidates: list[Agent]) -> list[Agent]:
+        content = str(chat.messages[-1]["content"]) if chat.messages else ""
+        return [agent for agent in candidates if agent.name in content]
+
+
+@dataclass
+class LLMSpeakerSelector(SpeakerSelector):
+    # Any model, e.g. a small one instead of the conversation one
+    llm_client: LLMClient
+
+    @property
+    def clients(self) -> list[LLMClient]:
+        return [self.llm_client]
+
+    def select(self, chat: "Chat", last_speaker: Agent) -> Agent:
+        candidates = self._get_candidates(chat, last_speaker)
+        # Nothing to choose, e.g. two agents that cannot speak twice in a row
+        if len(candidates) == 1:
+            return candidates[0]
+        reply = self.llm_client.create(self._get_messages(chat, candidates))
+        return self._parse(chat, reply, candidates, last_speaker)
+
+    async def a_select(self, chat: "Chat", last_speaker: Agent) -> Agent:
+        candidates = self._get_candidates(chat, last_speaker)
+        if len(candidates) == 1:
+            return candidates[0]
+        reply = await self.llm_client.a_create(self._get_messages(chat, candidates))
+        return self._parse(chat, reply, candidates, last_speaker)
+
+    def _get_messages(self, chat: "Chat", candidates: list[Agent]) -> list[dict]:
+        return (
+            [{"content": chat.select_speaker_msg(chat.agents), "role": "system"}]
+            + [
+                {"content": m["content"], "role": "user", "name": m["name"]}
+                for m in chat.messages
+            ]
+            + [
+                {
+                    "content": f"Read the above conversation. Then select the next role from {[agent.name for agent in candidates]} to play. Only return the role.",
+                    "role": "system",
+                }
+            ]
+        )
+
+    def _parse(
+        self, chat: "Chat", reply: str, candidates: list[Agent], last_speaker: Agent
+    ) -> Agent:
+        mentioned = [agent for agent in candidates if agent.name in reply]
+        if len(mentioned) == 1:
+            return mentioned[0]
+        logger.warning(
+            f"Speaker selection returned [{reply}], falling back to round robin"
+        )
+        return chat.next_agent(last_speaker)
+
+
+@dataclass
+class RuleSpeakerSelector(SpeakerSelector):
+
+    def select(self, chat: "Chat", last_speaker: Agent) -> Agent:
+        candidates = self._get_candidates(chat, last_speaker)
+        # Whoever is addressed by name answers
+        mentioned = self._get_mentioned(chat, candidates)
+        if len(mentioned) == 1:
+            return mentioned[0]
+        # Otherwise another role replies, whoever has been silent the longest
+        last_role = getattr(last_speaker, "role", None)
+        others = [
+            agent for agent in candidates if getattr(agent, "role", None) != last_role
+        ]
+        return min(others or candidates, key=lambda agent: self._last_turn(chat, agent))
+
+    def _last_turn(self, chat: "Chat", agent: Agent) -> int:
+        for i in reversed(range(len(chat.messages))):
+            if chat.messages[i].get("name") == agent.name:
+                return i
+        return -1
+
+
+@dataclass
+class CachedSpeakerSelector(SpeakerSelector):
+    # Decisions reused for the same recent speakers and mentions
+    selector: SpeakerSelector
+    window: int = SPEAKER_CACHE_WINDOW
+
+    decisions: dict[tuple, str] = field(default_factory=dict, init=False)
+
+    @property
+    def clients(self) -> list[LLMClient]:
+        return self.selector.clients
+
+    def select(self, chat: "Chat", last_speaker: Agent) -> Agent:
+        key = self._get_key(chat, last_speaker)
+        cached = self._get_cached(chat, key)
+        if cached is not None:
+            return cached
+        speaker = self.selector.select(chat, last_speaker)
+        self.decisions[key] = speaker.name
+        return speaker
+
+    async def a_select(self, chat: "Chat", last_speaker: Agent) -> Agent:
+        key = self._get_key(chat, last_speaker)
+        cached = self._get_cached(chat, key)
+        if cached is not None:
+            return cached
+        speaker = await self.selector.a_select(chat, last_speaker)
+        self.decisions[key] = speaker.name
+        return speaker
+
+    def _get_key(self, chat: "Chat", last_speaker: Agent) -> tuple:
+        speakers = tuple(m.get("name") for m in chat.messages[-self.window :])
+        mentioned = self._get_mentioned(chat, self._get_candidates(chat, last_speaker))
+        return speakers, tuple(agent.name for agent in mentioned)
+
+    def _get_cached(self, chat: "Chat", key: tuple) -> Agent | None:
+        if key not in self.decisions:
+            return None
+        logger.debug(f"Speaker selection reused for {key}")
+        return chat.agent_by_name(self.decisions[key])
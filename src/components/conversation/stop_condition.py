@@ -0,0 +1,87 @@
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable
+
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import JUDGE_WINDOW
+from ..llm.llm_client import LLMClient
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+class StopCondition(ABC):
+
+    @property
+    def clients(self) -> list[LLMClient]:
+        return []
+
+    @abstractmethod
+    def check(self, messages: list[dict]) -> str | None:
+        """
+        Checks whether the conversation has reached a terminal state.
+
+        Args:
+            messages (list[dict]): The messages of the day so far.
+
+        Returns:
+            str | None: The reason to stop, None to go on.
+        """
+        pass
+
+    async def a_check(self, messages: list[dict]) -> str | None:
+        return self.check(messages)
+
+
+@dataclass
+class PatternStopCondition(StopCondition):
+    pattern: str
+
+    def check(self, messages: list[dict]) -> str | None:
+        if re.search(self.pattern, str(messages[-1]["content"]), re.IGNORECASE):
+            return f"Matched [{self.pattern}]"
+        return None
+
+
+@dataclass
+class JudgeStopCondition(StopCondition):
+    # A cheap model asked whether the terminal state is reached
+    llm_client: LLMClient
+    state: str
+
+    @property
+    def clients(self) -> list[LLMClient]:
+        return [self.llm_client]
+
+    def check(self, messages: list[dict]) -> str | None:
+        return self._parse(self.llm_client.create(self._get_messages(messages)))
+
+    async def a_check(self, messages: list[dict]) -> str | None:
+        return self._parse(await self.llm_client.a_create(self._get_messages(messages)))
+
+    def _get_messages(self, messages: list[dict]) -> list[dict]:
+        transcript = "\n".join(
+            f"{m.get('name', m['role'])}: {m['content']}"
+            for m in messages[-JUDGE_WINDOW:]
+        )
+        return [
+            {
+                "content": f"You judge whether a conversation has reached this state: {self.state}\nAnswer only YES or NO.",
+                "role": "system",
+            },
+            {"content": transcript, "role": "user"},
+        ]
+
+    def _parse(self, reply: str) -> str | None:
+        if reply.strip().upper().startswith("YES"):
+            return f"Judged [{self.state}]"
+        return None
+
+
+@dataclass
+class CallbackStopCondition(StopCondition):
+    callback: Callable[[list[dict]], str | None]
+
+    def check(self, messages: list[dict]) -> str | None:
+        return self.callback(messages)
@@ -1,12 +1,20 @@
 from dataclasses import InitVar, dataclass, field
-import time
-import openai
-import httpx
 
-from autogen import OpenAIWrapper
 from itakello_logging import ItakelloLogging
 
+from ...utility.consts import (
+    CHARS_PER_TOKEN,
+    COMPACTION_PROMPT,
+    PARTIAL_SUMMARY_PROMPT,
+)
+from ...utility.enums import StreamMode
+from ..llm.context_budget import ContextBudget
+from ..llm.live_view import LiveView
 from ..llm.llm import LLM
+from ..llm.llm_client import LLMClient
+from ..llm.resilience import Resilience
+from ..llm.response_cache import ResponseCache
+from ..llm.tokens import count_messages_tokens
 from ..section.section import Section
 
 logger = ItakelloLogging().get_logger(__name__)
@@ -15,18 +23,37 @@ logger = ItakelloLogging().get_logger(__name__)
 @dataclass
 class Summarizer:
     system_message_dict: dict = field(init=False)
-    model: OpenAIWrapper = field(init=False)
+    llm_client: LLMClient = field(init=False)
+    # Days over the budget are summarized in chunks, not cut to a window
+    context_budget: ContextBudget | None = field(default=None, init=False)
 
     sections: InitVar[list[Section]]
     placeholders: InitVar[dict[str, str]]
     llm: InitVar[LLM]
+    cache: InitVar[ResponseCache | None] = None
+    resilience: InitVar[Resilience | None] = None
+    stream: InitVar[StreamMode] = StreamMode.OFF
 
     def __post_init__(
-        self, sections: list[Section], placeholders: dict[str, str], llm: LLM
+        self,
+        sections: list[Section],
+        placeholders: dict[str, str],
+        llm: LLM,
+        cache: ResponseCache | None,
+        resilience: Resilience | None,
+        stream: StreamMode,
     ) -> None:
         system_message = self._generate_system_message(sections, placeholders)
         self.system_message_oai = {"content": system_message, "role": "system"}
-        self.model = OpenAIWrapper(config_list=[llm.config])
+        self.llm_client = LLMClient(
+            llm=llm,
+            cache=cache,
+            resilience=resilience or Resilience(),
+            stream=stream != StreamMode.OFF,
+            live_view=(
+                LiveView(name=self._get_name()) if stream == StreamMode.LIVE else None
+            ),
+        )
         logger.debug(f"Summarizer created")
 
     def _generate_system_message(
@@ -41,36 +68,86 @@ class Summarizer:
         system_message = "\n\n".join(final_contents)
         return system_message
 
-    def generate_summary(self, previous_conversation, round_number: int) -> str:
-        """
-        Generate a summary with retry logic for transient LLM errors.
-        """
-        MAX_RETRIES = 3
-        attempts = 0
-        while True:
-            try:
-                summary_obj = self.model.create(
-                    messages=[self.system_message_oai] + previous_conversation
-                )
-                break
-            except (openai.error.OpenAIError, httpx.HTTPError) as e:
-                attempts += 1
-                if attempts >= MAX_RETRIES:
-                    logger.error(f"Summary generation failed after {attempts} attempts: {e}")
-                    raise
-                logger.warning(f"Error generating summary (attempt {attempts}/{MAX_RETRIES}): {e}. Retrying...")
-                time.sleep(2 ** attempts)
-            except Exception as e:
-                attempts += 1
-                if attempts >= MAX_RETRIES:
-                    logger.error(f"Unexpected error generating summary after {attempts} attempts: {e}")
-                    raise
-                logger.warning(f"Unexpected error generating summary (attempt {attempts}/{MAX_RETRIES}): {e}. Retrying...")
-                time.sleep(2 ** attempts)
-        summary_text = summary_obj.choices[0].message.content
+    def generate_summary(
+        self, previous_conversation: list[dict], round_number: int
+    ) -> str:
+        summary_text = ""
+        for chunk in self._get_chunks(previous_conversation):
+            summary_text = self.llm_client.create(
+                self._get_summary_messages(summary_text, chunk)
+            )
+        summary = f"Day {round_number} summary:\n {summary_text}"
+        return summary
+
+    async def a_generate_summary(
+        self, previous_conversation: list[dict], round_number: int
+    ) -> str:
+        summary_text = ""
+        for chunk in self._get_chunks(previous_conversation):
+            summary_text = await self.llm_client.a_create(
+                self._get_summary_messages(summary_text, chunk)
+            )
         summary = f"Day {round_number} summary:\n {summary_text}"
         return summary
 
+    def _get_chunks(self, conversation: list[dict]) -> list[list[dict]]:
+        budget = self.context_budget
+        # The summary itself has to fit in the context window too
+        completion_tokens = self.llm_client.limits.max_tokens
+        if budget is None or (
+            count_messages_tokens([self.system_message_oai] + conversation)
+            <= budget.max_tokens - completion_tokens
+        ):
+            return [conversation]
+        # Room for the prompt and the longest summary of the previous chunks
+        longest_earlier = self._get_earlier_message(
+            "-" * budget.summary_tokens * CHARS_PER_TOKEN
+        )
+        chunks = budget.split(
+            conversation,
+            reserved=count_messages_tokens([self.system_message_oai, longest_earlier])
+            + completion_tokens,
+        )
+        logger.debug(f"Day summarized in {len(chunks)} chunks")
+        return chunks
+
+    def _get_summary_messages(self, summary_text: str, chunk: list[dict]) -> list[dict]:
+        if not summary_text:
+            return [self.system_message_oai] + chunk
+        return [
+            self.system_message_oai,
+            self._get_earlier_message(summary_text),
+        ] + chunk
+
+    def _get_earlier_message(self, summary_text: str) -> dict:
+        if self.context_budget is not None:
+            summary_text = self.context_budget.cut_text(
+                summary_text, self.context_budget.summary_tokens
+            )
+        return {"content": f"{PARTIAL_SUMMARY_PROMPT}\n{summary_text}", "role": "user"}
+
     @classmethod
     def _get_name(cls) -> str:
         return "Summarizer"
+
+    def compact_summaries(self, compacted: str, summaries: list[str]) -> str:
+        return self.llm_client.create(
+            self._get_compaction_messages(compacted, summaries)
+        )
+
+    async def a_compact_summaries(self, compacted: str, summaries: list[str]) -> str:
+        return await self.llm_client.a_create(
+            self._get_compaction_messages(compacted, summaries)
+        )
+
+    def _get_compaction_messages(
+        self, compacted: str, summaries: list[str]
+    ) -> list[dict]:
+        # The earlier compacted summary is merged again, hierarchically
+        return [
+            {"content": COMPACTION_PROMPT, "role": "system"},
+            {
+                "content": "\n".join(filter(None, [compacted] + summaries)),
+                "role": "user",
+            },
+        ]
@@ -36,6 +36,10 @@ class Experiment(MongoModel):
     conversation_ids: list[ObjectId] = field(default_factory=list)
     id: ObjectId = field(default_factory=ObjectId)
     creation_date: datetime = field(default_factory=datetime.now)
+    # Smaller models for the summaries and the speaker selection, None for the
+    # conversation one
+    summarizer_llm: LLM | None = None
+    speaker_selection_llm: LLM | None = None
 
     def __post_init__(
         self,
@@ -88,6 +92,16 @@ class Experiment(MongoModel):
             conversation_ids=doc["conversation_ids"],
             id=doc["_id"],
             creation_date=doc["creation_date"],
+            summarizer_llm=(
+                LLM.from_document(doc["summarizer_llm"])
+                if doc.get("summarizer_llm")
+                else None
+            ),
+            speaker_selection_llm=(
+                LLM.from_document(doc["speaker_selection_llm"])
+                if doc.get("speaker_selection_llm")
+                else None
+            ),
         )
 
     def to_document(self) -> dict:
@@ -110,21 +124,44 @@ class Experiment(MongoModel):
             "creator": self.creator,
             "conversation_ids": self.conversation_ids,
             "creation_date": self.creation_date,
+            "summarizer_llm": (
+                self.summarizer_llm.to_document() if self.summarizer_llm else None
+            ),
+            "speaker_selection_llm": (
+                self.speaker_selection_llm.to_document()
+                if self.speaker_selection_llm
+                else None
+            ),
         }
 
     def to_selection(self) -> str:
-        roles = ", ".join(role.name for role in self.roles.values())
-        llms = ", ".join(llm.model for llm in self.llms.values())
+        return self.summary_to_selection(self.to_summary())
+
+    def to_summary(self) -> dict:
+        # Same fields as the listing query of the DatabaseManager
+        return {
+            "_id": self.id,
+            "n_conversations": len(self.conversation_ids),
+            "creator": self.creator,
+            "creation_date": self.creation_date,
+            "roles": [role.name for role in self.roles.values()],
+            "llms": [llm.model for llm in self.llms.values()],
+            "favourite": self.favourite,
+            "note": self.note,
+        }
+
+    @classmethod
+    def summary_to_selection(cls, summary: dict) -> str:
         selection = (
-            f"Number of conversations: {len(self.conversation_ids)}\t"
-            + f"Creator: {self.creator} [{self.creation_date.strftime(TIME_FORMAT)}]\t"
-            + f"Roles: {roles}\t"
-            + f"LLMs: {llms}\t"
+            f"Number of conversations: {summary['n_conversations']}\t"
+            + f"Creator: {summary['creator']} [{summary['creation_date'].strftime(TIME_FORMAT)}]\t"
+            + f"Roles: {', '.join(summary['roles'])}\t"
+            + f"LLMs: {', '.join(summary['llms'])}\t"
         )
-        if self.favourite:
+        if summary["favourite"]:
             selection += " ⭐"
-        if self.note:
-            selection += f"\tNote: {self.note}"
+        if summary["note"]:
+            selection += f"\tNote: {summary['note']}"
         return selection
 
     def __str__(self) -> str:
@@ -154,6 +191,8 @@ class Experiment(MongoModel):
             f"\033[1mID\033[0m: {self.id}\n\n"
             + f"\033[1mStarting message\033[0m: {self.starting_message}\n\n"
             + f"\033[1mLLMs\033[0m:\n- {llms}\n\n"
+            + f"\033[1mSummarizer LLM\033[0m: {self.summarizer_llm or 'conversation LLM'}\n\n"
+            + f"\033[1mSpeaker selection LLM\033[0m: {self.speaker_selection_llm or 'conversation LLM'}\n\n"
             + f"\033[1mRoles\033[0m:\n{roles}\n\n"
             + f"\033[1mShared sections\033[0m:\n-----\n{shared_sections}-----\n\n"
             + f"\033[1mSummarizer sections\033[0m:\n-----\n{summarizer_sections}-----\n\n"
@@ -180,6 +219,8 @@ class Experiment(MongoModel):
             placeholders_list=[
                 placeholder for placeholder in self.placeholders.values()
             ],
+            summarizer_llm=self.summarizer_llm,
+            speaker_selection_llm=self.speaker_selection_llm,
         )
 
     def compose_placeholders(
@@ -1,7 +1,7 @@
 from copy import deepcopy
 from dataclasses import dataclass, field
 
-import httpx
+from bson import ObjectId
 from itakello_logging import ItakelloLogging
 
 from ...core.database_manager import DatabaseManager
@@ -10,7 +10,9 @@ from ...interfaces import BaseManager
 from ...utility.consts import DEV_MODE
 from ...utility.custom_os import CustomOS
 from ...utility.enums import SectionType
+from ..llm.llm import LLM
 from ..llm.llm_manager import LLMManager
+from ..llm.usage import Usage
 from ..placeholder.placeholder import Placeholder
 from ..placeholder.placeholder_manager import PlaceholderManager
 from ..role.role_manager import RoleManager
@@ -46,6 +48,7 @@ class ExperimentManager(BaseManager):
         starting_message = self._ask_for_starting_message()
 
         llms = self.llm_m.ask_for_llms(optional=False)
+        summarizer_llm, speaker_selection_llm = self._ask_for_helper_llms()
 
         agents_sections = self.section_m.ask_for_sections(type=SectionType.ROLES)
         shared_sections, private_sections = self.section_m.ask_for_shared_sections(
@@ -69,6 +72,8 @@ class ExperimentManager(BaseManager):
             roles_list=roles,
             shared_sections_list=shared_sections,
             summarizer_sections_list=summarizer_sections,
+            summarizer_llm=summarizer_llm,
+            speaker_selection_llm=speaker_selection_llm,
         )
 
         self._ask_contents_empty_sections(experiment)
@@ -113,6 +118,7 @@ class ExperimentManager(BaseManager):
                 choices=[
                     "Starting message",
                     "LLMs",
+                    "Summarizer and speaker selection LLMs",
                     "Roles",
                     "Summarizer",
                 ],
@@ -133,6 +139,11 @@ class ExperimentManager(BaseManager):
                 default=", ".join(llm.model for llm in previous_llms)
             )
             experiment.llms = {llm.name: llm for llm in llms}
+        if "Summarizer and speaker selection LLMs" in changes:
+            (
+                experiment.summarizer_llm,
+                experiment.speaker_selection_llm,
+            ) = self._ask_for_helper_llms(experiment)
         if "Roles" in changes:
             self._update_roles(experiment)
         if "Summarizer" in changes:
@@ -144,24 +155,38 @@ class ExperimentManager(BaseManager):
 
         logger.confirmation("Experiment duplicated and updated successfully.")
 
-    def select_experiment(self) -> Experiment | None:
-        try:
-            experiments = self.db_m.get_experiments()
-        except httpx.ConnectError:
-            logger.error("Ollama is not currently running. Please start it.")
-            self.input_m.input_str(
-                "Press Enter when Ollama is running again", optional=True
+    def view_usage(self, experiment: Experiment) -> None:
+        if not experiment.conversation_ids:
+            logger.warning("No conversations available for this experiment.")
+            return
+        usage_by_model = self.db_m.get_conversation_usage(
+            experiment.conversation_ids, "llm.model"
+        )
+        logger.info(f"\033[1mUsage\033[0m: {sum(usage_by_model.values(), Usage())}")
+        for model, usage in usage_by_model.items():
+            logger.info(f"- Model {model}: {usage}")
+        for group_by in ("role", "day"):
+            usage = self.db_m.get_message_usage(
+                {"experiment_id": experiment.id}, group_by
             )
-            return None
-        if not experiments:
-            return None
-        choices = []
-        for experiment in experiments.values():
-            choices.append((experiment.to_selection(), str(experiment.id)))
-        selected_id = self.input_m.select_one(
-            message="Select an experiment", choices=choices
+            for group, group_usage in usage.items():
+                logger.info(f"- {group_by.capitalize()} {group}: {group_usage}")
+
+    def select_experiment(self) -> Experiment | None:
+        def get_choices(skip: int, limit: int) -> tuple[list[tuple[str, str]], int]:
+            summaries, total = self.db_m.get_experiment_summaries(skip, limit)
+            choices = [
+                (Experiment.summary_to_selection(summary), str(summary["_id"]))
+                for summary in summaries
+            ]
+            return choices, total
+
+        selected_id = self.input_m.select_page(
+            message="Select an experiment", get_choices=get_choices
         )
-        return experiments[selected_id]
+        if selected_id is None:
+            return None
+        return self.db_m.get_experiment(ObjectId(selected_id))
 
     def _update_roles(self, experiment: Experiment) -> None:
         section_type = SectionType.ROLES
@@ -289,6 +314,34 @@ class ExperimentManager(BaseManager):
 
         self._ask_contents_empty_sections(experiment)
 
+    def _ask_for_helper_llms(
+        self, experiment: Experiment | None = None
+    ) -> tuple[LLM | None, LLM | None]:
+        logger.instruction(
+            instructions=[
+                "A smaller LLM can write the daily summaries and select the speakers, leaving the conversation LLM to the agents",
+            ]
+        )
+        summarizer_llm = self.llm_m.ask_for_helper_llm(
+            purpose="summaries",
+            env_var="SUMMARIZER_LLM",
+            default=(
+                experiment.summarizer_llm.model
+                if experiment and experiment.summarizer_llm
+                else ""
+            ),
+        )
+        speaker_selection_llm = self.llm_m.ask_for_helper_llm(
+            purpose="speaker selection",
+            env_var="SPEAKER_SELECTION_LLM",
+            default=(
+                experiment.speaker_selection_llm.model
+                if experiment and experiment.speaker_selection_llm
+                else ""
+            ),
+        )
+        return summarizer_llm, speaker_selection_llm
+
     def _ask_for_starting_message(
         self, optional: bool = False, default: str = ""
     ) -> str:
@@ -0,0 +1,133 @@
+import asyncio
+import os
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import ClassVar
+
+import httpx
+import ollama
+import openai
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import DEFAULT_HTTP_POOL_SIZE, HTTP_KEEPALIVE_EXPIRY
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+class SharedHttpClient(openai.DefaultHttpxClient):
+    # autogen deep-copies its llm_config: the copies keep using the same pool
+    def __deepcopy__(self, memo: dict) -> "SharedHttpClient":
+        return self
+
+
+@dataclass
+class ClientRegistry:
+    # Keep-alive clients shared by every agent, manager and summarizer of the process
+    pool_size: int = DEFAULT_HTTP_POOL_SIZE
+
+    http_clients: dict[tuple[str, str], SharedHttpClient] = field(
+        default_factory=dict, init=False
+    )
+    clients: dict[tuple[str, str], openai.OpenAI] = field(
+        default_factory=dict, init=False
+    )
+    ollama_clients: dict[tuple[str, float | None], ollama.Client] = field(
+        default_factory=dict, init=False
+    )
+    # Async connections belong to the event loop they were opened on
+    async_clients: weakref.WeakKeyDictionary = field(
+        default_factory=weakref.WeakKeyDictionary, init=False
+    )
+    lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    instance: ClassVar["ClientRegistry | None"] = None
+    instance_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __post_init__(self) -> None:
+        logger.debug(f"Client registry with {self.pool_size} connections per endpoint")
+
+    @classmethod
+    def get(cls) -> "ClientRegistry":
+        with cls.instance_lock:
+            if cls.instance is None:
+                pool_size = os.getenv("HTTP_POOL_SIZE", "")
+                cls.instance = cls(
+                    pool_size=int(pool_size) if pool_size else DEFAULT_HTTP_POOL_SIZE
+                )
+            return cls.instance
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.instance = None
+        cls.instance_lock = threading.Lock()
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+
+    def get_http_client(self, base_url: str, api_key: str) -> SharedHttpClient:
+        key = (base_url, api_key)
+        with self.lock:
+            if key not in self.http_clients:
+                # Same defaults as the OpenAI client, with our pool size
+                self.http_clients[key] = SharedHttpClient(limits=self.limits)
+            return self.http_clients[key]
+
+    def get_client(self, base_url: str, api_key: str) -> openai.OpenAI:
+        http_client = self.get_http_client(base_url, api_key)
+        key = (base_url, api_key)
+        with self.lock:
+            if key not in self.clients:
+                self.clients[key] = openai.OpenAI(
+                    base_url=base_url,
+                    api_key=api_key,
+                    max_retries=0,
+                    http_client=http_client,
+                )
+            return self.clients[key]
+
+    def get_async_client(self, base_url: str, api_key: str) -> openai.AsyncOpenAI:
+        key = ("openai", base_url, api_key)
+        clients = self._get_loop_clients()
+        if key not in clients:
+            clients[key] = openai.AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                max_retries=0,
+                http_client=openai.DefaultAsyncHttpxClient(limits=self.limits),
+            )
+        return clients[key]
+
+    def get_ollama_client(self, host: str, timeout: float | None) -> ollama.Client:
+        # The native API takes its timeout from the client
+        key = (host, timeout)
+        with self.lock:
+            if key not in self.ollama_clients:
+                self.ollama_clients[key] = ollama.Client(
+                    host=host, timeout=timeout, limits=self.limits
+                )
+            return self.ollama_clients[key]
+
+    def get_async_ollama_client(
+        self, host: str, timeout: float | None
+    ) -> ollama.AsyncClient:
+        key = ("ollama", host, timeout)
+        clients = self._get_loop_clients()
+        if key not in clients:
+            clients[key] = ollama.AsyncClient(
+                host=host, timeout=timeout, limits=self.limits
+            )
+        return clients[key]
+
+    def _get_loop_clients(self) -> dict:
+        # Only the thread running the loop uses its clients
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if loop not in self.async_clients:
+                self.async_clients[loop] = {}
+            return self.async_clients[loop]
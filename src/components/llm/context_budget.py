@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+from math import ceil
+
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import CHARS_PER_TOKEN, CONTEXT_SUMMARY_SHARE, MIN_PROMPT_SHARE
+from .tokens import count_message_tokens, count_messages_tokens, count_tokens
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class ContextBudget:
+    max_tokens: int
+    summary_share: float = CONTEXT_SUMMARY_SHARE
+
+    @property
+    def summary_tokens(self) -> int:
+        # Room left to the summaries of the previous days
+        return int(self.max_tokens * self.summary_share)
+
+    def fit(self, messages: list[dict], completion_tokens: int = 0) -> list[dict]:
+        # The reply has to fit in the context window too
+        max_tokens = self.max_tokens - completion_tokens
+        if count_messages_tokens(messages) <= max_tokens:
+            return messages
+        # The instructions and the opening message of the day are always kept
+        opening = next(
+            (i for i, message in enumerate(messages) if message["role"] != "system"),
+            None,
+        )
+        pinned = [
+            i
+            for i, message in enumerate(messages)
+            if message["role"] == "system" or i == opening
+        ]
+        available = max_tokens - count_messages_tokens([messages[i] for i in pinned])
+        if available < 0:
+            messages = self._truncate(messages, pinned, -available)
+            available = max(
+                0, max_tokens - count_messages_tokens([messages[i] for i in pinned])
+            )
+        # Rolling window: the most recent turns that fit
+        window = set()
+        for i in reversed(range(len(messages))):
+            if i in pinned:
+                continue
+            tokens = count_message_tokens(messages[i])
+            if tokens > available:
+                break
+            window.add(i)
+            available -= tokens
+        fitted = [
+            message for i, message in enumerate(messages) if i in pinned or i in window
+        ]
+        logger.debug(
+            f"Context budget: dropped {len(messages) - len(fitted)} of {len(messages)} messages"
+        )
+        if count_messages_tokens(fitted) > max_tokens:
+            logger.warning(
+                f"Context budget of {self.max_tokens} tokens exceeded: the prompts cannot be cut further"
+            )
+        return fitted
+
+    def split(self, messages: list[dict], reserved: int) -> list[list[dict]]:
+        # Consecutive chunks, each fitting next to `reserved` tokens of prompts
+        available = self.max_tokens - reserved
+        chunks: list[list[dict]] = []
+        chunk: list[dict] = []
+        chunk_tokens = 0
+        for message in messages:
+            tokens = count_message_tokens(message)
+            if tokens > available:
+                message = self._cut(message, tokens - max(available, 0))
+                tokens = count_message_tokens(message)
+            if chunk and chunk_tokens + tokens > available:
+                chunks.append(chunk)
+                chunk, chunk_tokens = [], 0
+            chunk.append(message)
+            chunk_tokens += tokens
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _truncate(
+        self, messages: list[dict], pinned: list[int], excess: int
+    ) -> list[dict]:
+        # Only happens with a budget smaller than the prompts themselves
+        logger.warning(
+            f"Context budget of {self.max_tokens} tokens too small, truncating the prompts by {excess} tokens"
+        )
+        messages = list(messages)
+        sizes = {i: count_tokens(str(messages[i]["content"] or "")) for i in pinned}
+        total = sum(sizes.values()) or 1
+        for i in pinned:
+            # Each prompt gives up the same share, instructions keep a minimum
+            cut = ceil(excess * sizes[i] / total)
+            if messages[i]["role"] == "system":
+                cut = min(cut, sizes[i] - ceil(sizes[i] * MIN_PROMPT_SHARE))
+            messages[i] = self._cut(messages[i], cut)
+            excess -= sizes[i] - count_tokens(messages[i]["content"])
+        # What the instructions cannot give up is taken from the other prompts
+        for i in pinned:
+            if excess <= 0:
+                break
+            if messages[i]["role"] != "system":
+                size = count_tokens(messages[i]["content"])
+                messages[i] = self._cut(messages[i], excess)
+                excess -= size - count_tokens(messages[i]["content"])
+        return messages
+
+    @staticmethod
+    def cut_text(text: str, max_tokens: int) -> str:
+        return text[: max(0, max_tokens) * CHARS_PER_TOKEN]
+
+    def _cut(self, message: dict, tokens: int) -> dict:
+        content = str(message["content"] or "")
+        keep = max(0, count_tokens(content) - tokens)
+        return {**message, "content": self.cut_text(content, keep)}
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import ClassVar
+
+import httpx
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import ENDPOINT_PROBE_TIMEOUT
+from .resilience import CircuitBreaker, CircuitOpenError, is_transient
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class Endpoint:
+    url: str
+    outstanding: int = 0
+    probing: bool = False
+    breaker: CircuitBreaker = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.breaker = CircuitBreaker(name=f"Endpoint {self.url}")
+
+
+@dataclass
+class EndpointPool:
+    urls: tuple[str, ...]
+
+    endpoints: list[Endpoint] = field(init=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    turn: int = field(default=0, init=False)
+
+    instances: ClassVar[dict[tuple[str, ...], "EndpointPool"]] = {}
+    instances_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __post_init__(self) -> None:
+        self.endpoints = [Endpoint(url=url) for url in self.urls]
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.instances = {}
+        cls.instances_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, urls: list[str]) -> "EndpointPool":
+        # One pool per set of endpoints and process, shared by all the LLMs using it
+        key = tuple(urls)
+        with cls.instances_lock:
+            if key not in cls.instances:
+                cls.instances[key] = cls(urls=key)
+            return cls.instances[key]
+
+    @contextmanager
+    def acquire(self) -> Iterator[str]:
+        endpoint = self._select()
+        try:
+            yield endpoint.url
+        finally:
+            with self.lock:
+                endpoint.outstanding -= 1
+
+    def ranked_urls(self) -> list[str]:
+        # Available endpoints first, the least loaded before the others
+        with self.lock:
+            ranked = sorted(
+                self.endpoints, key=lambda e: (e.breaker.is_open, e.outstanding)
+            )
+            return [endpoint.url for endpoint in ranked]
+
+    def has_available(self) -> bool:
+        with self.lock:
+            return any(not endpoint.breaker.is_open for endpoint in self.endpoints)
+
+    def record_failure(self, url: str, error: BaseException) -> None:
+        if not is_transient(error):
+            return
+        with self.lock:
+            self._get_endpoint(url).breaker.record_failure(error)
+
+    def record_success(self, url: str) -> None:
+        with self.lock:
+            self._get_endpoint(url).breaker.record_success()
+
+    def check_health(self) -> None:
+        for endpoint in self.endpoints:
+            self._probe(endpoint)
+
+    def _select(self) -> Endpoint:
+        with self.lock:
+            now = time.monotonic()
+            for endpoint in self.endpoints:
+                # Half-open: a probe decides whether the endpoint is back
+                if (
+                    endpoint.breaker.is_open
+                    and not endpoint.probing
+                    and endpoint.breaker.retry_at <= now
+                ):
+                    endpoint.probing = True
+                    threading.Thread(
+                        target=self._probe, args=(endpoint,), daemon=True
+                    ).start()
+            candidates = [e for e in self.endpoints if not e.breaker.is_open]
+            if not candidates:
+                retry_after = min(e.breaker.retry_at for e in self.endpoints) - now
+                raise CircuitOpenError(
+                    name=", ".join(self.urls),
+                    retry_after=max(retry_after, ENDPOINT_PROBE_TIMEOUT),
+                )
+            # Ties rotate, so that sequential requests are spread as well
+            self.turn += 1
+            endpoint = min(
+                candidates,
+                key=lambda e: (
+                    e.outstanding,
+                    (self.endpoints.index(e) - self.turn) % len(self.endpoints),
+                ),
+            )
+            endpoint.outstanding += 1
+            return endpoint
+
+    def _probe(self, endpoint: Endpoint) -> None:
+        try:
+            response = httpx.get(
+                f"{endpoint.url}/models", timeout=ENDPOINT_PROBE_TIMEOUT
+            )
+            if response.status_code >= 500:
+                raise httpx.HTTPStatusError(
+                    f"Status {response.status_code}",
+                    request=response.request,
+                    response=response,
+                )
+            self.record_success(endpoint.url)
+        except httpx.HTTPError:
+            with self.lock:
+                endpoint.breaker.trip()
+        finally:
+            endpoint.probing = False
+
+    def _get_endpoint(self, url: str) -> Endpoint:
+        return next(e for e in self.endpoints if e.url == url)
@@ -0,0 +1,57 @@
+from dataclasses import dataclass, field
+
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import MAX_STOP_SEQUENCES
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class GenerationLimits:
+    # 0 means no limit
+    max_tokens: int = 0
+    stop: list[str] = field(default_factory=list)
+    timeout: float = 0.0
+
+    def __post_init__(self) -> None:
+        if len(self.stop) > MAX_STOP_SEQUENCES:
+            logger.warning(
+                f"Only the first {MAX_STOP_SEQUENCES} of {len(self.stop)} stop sequences are sent: {self.stop[MAX_STOP_SEQUENCES:]} dropped"
+            )
+
+    @property
+    def stop_sequences(self) -> list[str]:
+        # The OpenAI API accepts at most 4 of them
+        return self.stop[:MAX_STOP_SEQUENCES]
+
+    def to_openai_params(self) -> dict:
+        params = {}
+        if self.max_tokens:
+            params["max_tokens"] = self.max_tokens
+        if self.stop_sequences:
+            params["stop"] = self.stop_sequences
+        if self.timeout:
+            params["timeout"] = self.timeout
+        return params
+
+    def to_ollama_options(self) -> dict:
+        options = {}
+        if self.max_tokens:
+            options["num_predict"] = self.max_tokens
+        if self.stop_sequences:
+            options["stop"] = self.stop_sequences
+        return options
+
+    def apply(self, llm_config: dict) -> dict:
+        params = self.to_openai_params()
+        timeout = params.pop("timeout", None)
+        llm_config = {
+            **llm_config,
+            "config_list": [
+                {**config, **params} for config in llm_config["config_list"]
+            ],
+        }
+        if timeout is not None:
+            llm_config["timeout"] = timeout
+        return llm_config
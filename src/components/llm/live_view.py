@@ -0,0 +1,47 @@
+import sys
+import threading
+from dataclasses import dataclass
+from typing import ClassVar
+
+
+@dataclass
+class LiveView:
+    # Console view of a reply while its tokens arrive
+    name: str
+
+    # The console is shared by every view of the process
+    lock: ClassVar[threading.Lock] = threading.Lock()
+    current: ClassVar["LiveView | None"] = None
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.lock = threading.Lock()
+        cls.current = None
+
+    def start(self) -> None:
+        # The header shows up at once, so a stalled backend is visible
+        with self.lock:
+            self._write_header()
+
+    def write(self, token: str) -> None:
+        with self.lock:
+            if LiveView.current is not self:
+                self._write_header()
+            sys.stdout.write(token)
+            sys.stdout.flush()
+
+    def end(self, ttft: float, elapsed: float, completion_tokens: int) -> None:
+        speed = completion_tokens / (elapsed - ttft) if elapsed > ttft else 0.0
+        with self.lock:
+            if LiveView.current is not self:
+                self._write_header()
+            sys.stdout.write(
+                f"\n\033[2m[{self.name}] TTFT: {ttft:.2f}s | {speed:.1f} tokens/s\033[0m\n"
+            )
+            sys.stdout.flush()
+            LiveView.current = None
+
+    def _write_header(self) -> None:
+        sys.stdout.write(f"\n\033[1m{self.name}\033[0m (live): ")
+        sys.stdout.flush()
+        LiveView.current = self
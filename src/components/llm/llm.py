@@ -1,16 +1,21 @@
 import asyncio
 import os
 import tempfile
+import threading
 from collections.abc import AsyncIterator
 from dataclasses import dataclass, field
-from typing import Mapping
+from typing import ClassVar, Mapping
 
+import httpx
 import ollama
 from itakello_logging import ItakelloLogging
 from tqdm import tqdm
 
 from ...interfaces.mongo_model import MongoModel
-from ...utility.consts import MAX_CONTEXT_LEN
+from ...utility.consts import DEFAULT_OLLAMA_BASE_URL, MAX_CONTEXT_LEN
+from ...utility.enums import SamplingMode
+from .client_registry import ClientRegistry
+from .endpoint_pool import EndpointPool
 
 logger = ItakelloLogging().get_logger(__name__)
 
@@ -21,23 +26,37 @@ class LLM(MongoModel):
     temperature: float = 0.7
     top_k: int = 40
     top_p: float = 0.9
+    endpoints: list[str] = field(default_factory=list)
     name: str = field(init=False)
     config: dict = field(init=False)
+    sampling_mode: SamplingMode = field(init=False)
+    provisioned: bool = field(default=False, init=False)
+
+    # Shared by every LLM of the process to avoid listing the Ollama models each time
+    available_models: ClassVar[dict[str, set[str]]] = {}
+    provision_lock: ClassVar[threading.RLock] = threading.RLock()
 
     def __post_init__(self) -> None:
         self.model = self.model.lower()
+        self.sampling_mode = SamplingMode(
+            os.getenv("OLLAMA_SAMPLING_MODE", SamplingMode.MODELFILE.value)
+        )
 
         # If this is an OpenAI GPT model, configure for OpenAI API instead of Ollama
         if self.model.startswith("gpt-"):
             # Configure for OpenAI API (e.g., gpt-3.5-turbo) and set instance name
+            self.endpoints = self.endpoints or [
+                os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+            ]
             self.config = {
                 "model": self.model,
                 "api_key": os.getenv("OPENAI_API_KEY", ""),
-                "base_url": os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
+                "base_url": self.endpoints[0],
                 "cache_seed": None,
             }
             # Use the model identifier as the name for token-summary lookup and selection
             self.name = self.model
+            self.provisioned = True
             logger.debug(f"Created an OpenAI LLM instance: {self.model}")
             return
 
@@ -45,16 +64,26 @@ class LLM(MongoModel):
         if ":" not in self.model:
             self.model = f"{self.model}:latest"
 
-        self.create_custom_model()
+        # The Ollama model is pulled/created lazily, see provision()
+        self.name = self._create_name()
+        self.endpoints = [
+            self._normalize_endpoint(endpoint)
+            for endpoint in self.endpoints or [DEFAULT_OLLAMA_BASE_URL]
+        ]
         self.config = {
-            "model": self.model,
-            "base_url": "http://localhost:11434/v1",
+            # In request mode the base model is shared by every parameter set
+            "model": self.model if self.uses_request_options else self.name,
+            "base_url": self.endpoints[0],
             "api_key": "ollama",
             "cache_seed": None,
             # Price per 1k tokens: [prompt_price_per_1k, completion_price_per_1k]
             # Local models are free by default
             "price": [0.0, 0.0],
         }
+        if self.uses_request_options:
+            # Only the OpenAI-compatible subset, for requests made through autogen
+            self.config["temperature"] = self.temperature
+            self.config["top_p"] = self.top_p
         logger.debug(f"Created a new Ollama LLM instance: {self.model}")
 
     @classmethod
@@ -64,10 +93,71 @@ class LLM(MongoModel):
             temperature=doc["temperature"],
             top_k=doc["top_k"],
             top_p=doc["top_p"],
+            endpoints=doc.get("endpoints", []),
         )
 
     def __str__(self) -> str:
-        return f"{self.model} (temperature: {self.temperature}, top_k: {self.top_k}, top_p: {self.top_p})"
+        endpoints = (
+            f", endpoints: {', '.join(self.endpoints)}"
+            if len(self.endpoints) > 1
+            else ""
+        )
+        return f"{self.model} (temperature: {self.temperature}, top_k: {self.top_k}, top_p: {self.top_p}{endpoints})"
+
+    @property
+    def is_ollama(self) -> bool:
+        return not self.model.startswith("gpt-")
+
+    @property
+    def pool(self) -> EndpointPool:
+        return EndpointPool.get(self.endpoints)
+
+    @property
+    def backend(self) -> str:
+        return "|".join(self.endpoints)
+
+    @property
+    def llm_config(self) -> dict:
+        # For autogen: one entry per endpoint, which fails over in order
+        config = {
+            key: value for key, value in self.config.items() if key != "cache_seed"
+        }
+        # Retries are handled by the Chat, see Resilience
+        config["max_retries"] = 0
+        registry = ClientRegistry.get()
+        return {
+            "config_list": [
+                {
+                    **config,
+                    "base_url": url,
+                    "http_client": registry.get_http_client(
+                        url, config["api_key"] or "none"
+                    ),
+                }
+                for url in self.pool.ranked_urls()
+            ],
+            "cache_seed": None,
+        }
+
+    @property
+    def uses_request_options(self) -> bool:
+        return self.sampling_mode == SamplingMode.REQUEST and self.is_ollama
+
+    @property
+    def request_options(self) -> dict:
+        return {
+            "temperature": self.temperature,
+            "top_k": self.top_k,
+            "top_p": self.top_p,
+            "num_ctx": MAX_CONTEXT_LEN,
+        }
+
+    def set_endpoints(self, endpoints: list[str]) -> None:
+        if self.is_ollama:
+            endpoints = [self._normalize_endpoint(endpoint) for endpoint in endpoints]
+        self.endpoints = endpoints
+        self.config["base_url"] = endpoints[0]
+        self.provisioned = not self.is_ollama
 
     def to_document(self) -> dict:
         return {
@@ -75,6 +165,7 @@ class LLM(MongoModel):
             "temperature": self.temperature,
             "top_k": self.top_k,
             "top_p": self.top_p,
+            "endpoints": self.endpoints,
         }
 
     async def show_async_progress_tqdm(self, iterator: AsyncIterator) -> None:
@@ -97,31 +188,93 @@ class LLM(MongoModel):
             pbar.clear()
             pbar.close()
 
-    async def _download_model(self) -> None:
-        iterator = await ollama.AsyncClient().pull(model=self.model, stream=True)
+    async def _download_model(self, host: str) -> None:
+        iterator = await ollama.AsyncClient(host=host).pull(
+            model=self.model, stream=True
+        )
         if isinstance(iterator, Mapping):
             raise TypeError("Error while pulling the model")
         await self.show_async_progress_tqdm(iterator)
 
+    @classmethod
+    def reset(cls) -> None:
+        cls.provision_lock = threading.RLock()
+
+    def provision(self, force: bool = False) -> None:
+        if self.provisioned and not force:
+            return
+        with LLM.provision_lock:
+            if not self.provisioned or force:
+                self.create_custom_model()
+                self.provisioned = True
+
+    def load(self, keep_alive: str) -> None:
+        # A generation without a prompt only loads the model into memory
+        self.provision()
+        for host in self._get_ollama_hosts():
+            ClientRegistry.get().get_ollama_client(host, None).generate(
+                model=self.config["model"], keep_alive=keep_alive
+            )
+        logger.debug(f"Model [{self.config['model']}] loaded")
+
+    def unload(self) -> None:
+        for host in self._get_ollama_hosts():
+            ClientRegistry.get().get_ollama_client(host, None).generate(
+                model=self.config["model"], keep_alive=0
+            )
+        logger.debug(f"Model [{self.config['model']}] unloaded")
+
     def create_custom_model(self) -> None:
-        available_models = ollama.list()["models"]
-        if not available_models:
-            curr_models = []
-        else:
-            # The 'model' attribute holds the model name in the Ollama list response
-            curr_models = [model["model"] for model in available_models]
+        self.name = self._create_name()
+        errors = []
+        for endpoint, host in zip(self.endpoints, self._get_ollama_hosts()):
+            try:
+                self._create_custom_model(host)
+            except (ConnectionError, httpx.ConnectError) as e:
+                # The other endpoints serve the model until this one is back
+                self.pool.record_failure(endpoint, e)
+                errors.append(e)
+        if len(errors) == len(self.endpoints):
+            raise errors[0]
+
+    def _create_custom_model(self, host: str) -> None:
+        curr_models = self._get_available_models(host)
         if self.model not in curr_models:
             logger.warning(
-                f"Model [{self.model}] does not exist, pulling it. Please wait..."
+                f"Model [{self.model}] does not exist on [{host}], pulling it. Please wait..."
             )
-            asyncio.run(self._download_model())
+            asyncio.run(self._download_model(host))
+            curr_models.add(self.model)
             logger.confirmation(f"Model [{self.model}] pulled successfully")
-        self.name = self._create_name()
-        if self.name not in curr_models:
-            self._create_vai_modelfile()
+        if self.uses_request_options:
+            return
+        if self.name not in curr_models and f"{self.name}:latest" not in curr_models:
+            self._create_vai_modelfile(host)
+            curr_models.add(self.name)
             logger.debug(f"Model [{self.name}] created successfully")
 
-    def _create_vai_modelfile(self) -> None:
+    def _get_available_models(self, host: str) -> set[str]:
+        if host not in LLM.available_models:
+            available_models = (
+                ClientRegistry.get().get_ollama_client(host, None).list()["models"]
+            )
+            # The 'model' attribute holds the model name in the Ollama list response
+            LLM.available_models[host] = {
+                model["model"] for model in available_models or []
+            }
+        return LLM.available_models[host]
+
+    def _get_ollama_hosts(self) -> list[str]:
+        return [endpoint.removesuffix("/v1") for endpoint in self.endpoints]
+
+    def _normalize_endpoint(self, endpoint: str) -> str:
+        # Ollama serves the OpenAI-compatible API under /v1
+        endpoint = endpoint.strip().rstrip("/")
+        if not endpoint.startswith("http"):
+            endpoint = f"http://{endpoint}"
+        return endpoint if endpoint.endswith("/v1") else f"{endpoint}/v1"
+
+    def _create_vai_modelfile(self, host: str) -> None:
         modelfile_content = (
             f"FROM {self.model}\n"
             f"PARAMETER temperature {self.temperature}\n"
@@ -135,7 +288,7 @@ class LLM(MongoModel):
             tmp_path = tmp.name
         # Upload the Modelfile blob and create a custom model from it
         # Use the same client instance for blob upload and model creation
-        client = ollama.Client()
+        client = ClientRegistry.get().get_ollama_client(host, None)
         digest = client.create_blob(tmp_path)
         # Create the custom model from the uploaded Modelfile blob
         client.create(model=self.name, from_=self.model, files={"Modelfile": digest})
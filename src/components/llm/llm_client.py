@@ -0,0 +1,388 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+import ollama
+import openai
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import RATE_LIMIT_PAUSE
+from .client_registry import ClientRegistry
+from .context_budget import ContextBudget
+from .generation_limits import GenerationLimits
+from .live_view import LiveView
+from .llm import LLM
+from .rate_limiter import RateLimiter
+from .resilience import Resilience
+from .response_cache import ResponseCache
+from .usage import Usage
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class Completion:
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+    # Without streaming the first token arrives with the whole response
+    ttft: float = 0.0
+    endpoint: str = ""
+
+
+@dataclass
+class LLMClient:
+    llm: LLM
+    cache: ResponseCache | None = None
+    resilience: Resilience = field(default_factory=Resilience)
+    # Shared accumulator, e.g. the one of the conversation
+    usage: Usage | None = None
+    context_budget: ContextBudget | None = None
+    limits: GenerationLimits = field(default_factory=GenerationLimits)
+    # Streamed replies measure the time to first token and can be shown live
+    stream: bool = False
+    live_view: LiveView | None = None
+
+    last_completion: Completion | None = field(default=None, init=False)
+
+    def create(self, messages: list[dict]) -> str:
+        if self.context_budget is not None:
+            messages = self.context_budget.fit(messages, self.limits.max_tokens)
+        cache_key = self._get_cache_key(messages)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.last_completion = Completion(content=cached, endpoint="cache")
+                return cached
+        self.llm.provision()
+        completion = self.resilience.call(
+            lambda url: self._request(url, messages),
+            pool=self.llm.pool,
+            retry_timeouts=not self.limits.timeout,
+        )
+        return self._handle_completion(completion, cache_key)
+
+    async def a_create(self, messages: list[dict]) -> str:
+        if self.context_budget is not None:
+            messages = self.context_budget.fit(messages, self.limits.max_tokens)
+        cache_key = self._get_cache_key(messages)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.last_completion = Completion(content=cached, endpoint="cache")
+                return cached
+        if not self.llm.provisioned:
+            await asyncio.to_thread(self.llm.provision)
+        completion = await self.resilience.a_call(
+            lambda url: self._a_request(url, messages),
+            pool=self.llm.pool,
+            retry_timeouts=not self.limits.timeout,
+        )
+        return self._handle_completion(completion, cache_key)
+
+    def _request(self, url: str, messages: list[dict]) -> Completion:
+        limiter = RateLimiter.get(url, self.llm.config["model"])
+        estimated = 0
+        if limiter is not None:
+            estimated = limiter.estimate(messages)
+            limiter.wait(estimated)
+        start = time.perf_counter()
+        try:
+            if self.stream:
+                completion = self._send_stream(url, messages, start)
+            else:
+                completion = self._send(url, messages)
+        except openai.RateLimitError as e:
+            if limiter is not None:
+                limiter.pause(self._get_retry_after(e))
+            raise
+        return self._measure(completion, url, start, limiter, estimated)
+
+    async def _a_request(self, url: str, messages: list[dict]) -> Completion:
+        limiter = RateLimiter.get(url, self.llm.config["model"])
+        estimated = 0
+        if limiter is not None:
+            estimated = limiter.estimate(messages)
+            await limiter.a_wait(estimated)
+        start = time.perf_counter()
+        try:
+            if self.stream:
+                completion = await self._a_send_stream(url, messages, start)
+            else:
+                completion = await self._a_send_within_timeout(url, messages)
+        except openai.RateLimitError as e:
+            if limiter is not None:
+                limiter.pause(self._get_retry_after(e))
+            raise
+        return self._measure(completion, url, start, limiter, estimated)
+
+    async def _a_send_within_timeout(
+        self, url: str, messages: list[dict]
+    ) -> Completion:
+        # The read timeout of the clients only bounds the wait for each chunk
+        if not self.limits.timeout:
+            return await self._a_send(url, messages)
+        try:
+            return await asyncio.wait_for(
+                self._a_send(url, messages), self.limits.timeout
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"No reply from [{self.llm.config['model']}] within the {self.limits.timeout:g}s timeout"
+            ) from None
+
+    def _send(self, url: str, messages: list[dict]) -> Completion:
+        if self.llm.uses_request_options:
+            response = self._get_ollama_client(url).chat(
+                model=self.llm.config["model"],
+                messages=self._to_ollama_messages(messages),
+                options={
+                    **self.llm.request_options,
+                    **self.limits.to_ollama_options(),
+                },
+            )
+            return self._from_ollama_response(response)
+        response = self._get_client(url).chat.completions.create(
+            model=self.llm.config["model"],
+            messages=messages,  # type: ignore
+            **self.limits.to_openai_params(),
+        )
+        return self._from_openai_response(response)
+
+    async def _a_send(self, url: str, messages: list[dict]) -> Completion:
+        if self.llm.uses_request_options:
+            response = await self._get_async_ollama_client(url).chat(
+                model=self.llm.config["model"],
+                messages=self._to_ollama_messages(messages),
+                options={
+                    **self.llm.request_options,
+                    **self.limits.to_ollama_options(),
+                },
+            )
+            return self._from_ollama_response(response)
+        response = await self._get_async_client(url).chat.completions.create(
+            model=self.llm.config["model"],
+            messages=messages,  # type: ignore
+            **self.limits.to_openai_params(),
+        )
+        return self._from_openai_response(response)
+
+    def _send_stream(self, url: str, messages: list[dict], start: float) -> Completion:
+        completion = Completion(content="")
+        if self.live_view is not None:
+            self.live_view.start()
+        if self.llm.uses_request_options:
+            stream = self._get_ollama_client(url).chat(
+                model=self.llm.config["model"],
+                messages=self._to_ollama_messages(messages),
+                options={
+                    **self.llm.request_options,
+                    **self.limits.to_ollama_options(),
+                },
+                stream=True,
+            )
+            add_chunk = self._add_ollama_chunk
+        else:
+            stream = self._get_client(url).chat.completions.create(
+                model=self.llm.config["model"],
+                messages=messages,  # type: ignore
+                stream=True,
+                stream_options={"include_usage": True},
+                **self.limits.to_openai_params(),
+            )
+            add_chunk = self._add_openai_chunk
+        try:
+            for chunk in stream:
+                add_chunk(completion, chunk, start)
+                if self._is_past_deadline(start):
+                    break
+        finally:
+            stream.close()
+        return self._end_stream(completion, start)
+
+    async def _a_send_stream(
+        self, url: str, messages: list[dict], start: float
+    ) -> Completion:
+        completion = Completion(content="")
+        if self.live_view is not None:
+            self.live_view.start()
+        if self.llm.uses_request_options:
+            stream = await self._get_async_ollama_client(url).chat(
+                model=self.llm.config["model"],
+                messages=self._to_ollama_messages(messages),
+                options={
+                    **self.llm.request_options,
+                    **self.limits.to_ollama_options(),
+                },
+                stream=True,
+            )
+            add_chunk = self._add_ollama_chunk
+        else:
+            stream = await self._get_async_client(url).chat.completions.create(
+                model=self.llm.config["model"],
+                messages=messages,  # type: ignore
+                stream=True,
+                stream_options={"include_usage": True},
+                **self.limits.to_openai_params(),
+            )
+            add_chunk = self._add_openai_chunk
+        chunks = aiter(stream)
+        try:
+            while True:
+                try:
+                    # Each chunk is awaited for no longer than the time left
+                    chunk = await asyncio.wait_for(
+                        anext(chunks), self._get_time_left(start)
+                    )
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self._warn_cut()
+                    break
+                add_chunk(completion, chunk, start)
+        finally:
+            # An async generator for Ollama, an AsyncStream for OpenAI
+            await (stream.aclose() if hasattr(stream, "aclose") else stream.close())
+        return self._end_stream(completion, start)
+
+    def _is_past_deadline(self, start: float) -> bool:
+        # The role timeout bounds the whole turn: a long reply is cut, not awaited
+        time_left = self._get_time_left(start)
+        if time_left is None or time_left > 0:
+            return False
+        self._warn_cut()
+        return True
+
+    def _get_time_left(self, start: float) -> float | None:
+        if not self.limits.timeout:
+            return None
+        return max(0.0, start + self.limits.timeout - time.perf_counter())
+
+    def _warn_cut(self) -> None:
+        logger.warning(
+            f"Reply of [{self.llm.config['model']}] cut after the {self.limits.timeout:g}s timeout"
+        )
+
+    def _add_openai_chunk(self, completion: Completion, chunk, start: float) -> None:
+        # The usage comes with the last chunk, which has no choices
+        if chunk.usage:
+            completion.prompt_tokens = chunk.usage.prompt_tokens
+            completion.completion_tokens = chunk.usage.completion_tokens
+        if chunk.choices:
+            self._add_token(completion, chunk.choices[0].delta.content or "", start)
+
+    def _add_ollama_chunk(self, completion: Completion, chunk, start: float) -> None:
+        if chunk.get("done"):
+            completion.prompt_tokens = chunk.get("prompt_eval_count") or 0
+            completion.completion_tokens = chunk.get("eval_count") or 0
+        self._add_token(completion, chunk["message"]["content"] or "", start)
+
+    def _add_token(self, completion: Completion, token: str, start: float) -> None:
+        if not token:
+            return
+        if not completion.content:
+            completion.ttft = time.perf_counter() - start
+        completion.content += token
+        if self.live_view is not None:
+            self.live_view.write(token)
+
+    def _end_stream(self, completion: Completion, start: float) -> Completion:
+        if self.live_view is not None:
+            self.live_view.end(
+                completion.ttft,
+                time.perf_counter() - start,
+                completion.completion_tokens,
+            )
+        return completion
+
+    def _measure(
+        self,
+        completion: Completion,
+        url: str,
+        start: float,
+        limiter: RateLimiter | None,
+        estimated: int,
+    ) -> Completion:
+        completion.latency = time.perf_counter() - start
+        completion.ttft = completion.ttft or completion.latency
+        completion.endpoint = url
+        if limiter is not None:
+            limiter.record_usage(
+                estimated, completion.prompt_tokens, completion.completion_tokens
+            )
+        return completion
+
+    def _get_retry_after(self, error: openai.RateLimitError) -> float:
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            return float(retry_after) if retry_after else RATE_LIMIT_PAUSE
+        except ValueError:
+            return RATE_LIMIT_PAUSE
+
+    def _from_openai_response(self, response) -> Completion:
+        usage = response.usage
+        return Completion(
+            content=response.choices[0].message.content or "",
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+
+    def _from_ollama_response(self, response) -> Completion:
+        return Completion(
+            content=response["message"]["content"] or "",
+            prompt_tokens=response.get("prompt_eval_count") or 0,
+            completion_tokens=response.get("eval_count") or 0,
+        )
+
+    def _to_ollama_messages(self, messages: list[dict]) -> list[dict]:
+        # The native API has no 'name' field, as the OpenAI-compatible one ignores it
+        return [
+            {"role": message["role"], "content": message["content"]}
+            for message in messages
+        ]
+
+    def _handle_completion(self, completion: Completion, cache_key: str) -> str:
+        logger.info(
+            f"Previous tokens: {completion.prompt_tokens} | New tokens: {completion.completion_tokens} | Total tokens: {completion.prompt_tokens + completion.completion_tokens} | Latency: {completion.latency:.2f}s"
+            + (f" | TTFT: {completion.ttft:.2f}s" if self.stream else "")
+        )
+        self.last_completion = completion
+        if self.usage is not None:
+            self.usage.add(
+                completion.prompt_tokens,
+                completion.completion_tokens,
+                completion.latency,
+            )
+        if self.cache is not None:
+            self.cache.set(cache_key, completion.content)
+        return completion.content
+
+    def _get_cache_key(self, messages: list[dict]) -> str:
+        params = {
+            "temperature": self.llm.temperature,
+            "top_k": self.llm.top_k,
+            "top_p": self.llm.top_p,
+            **self.limits.to_ollama_options(),
+        }
+        return ResponseCache.make_key(self.llm.config["model"], params, messages)
+
+    def _get_client(self, url: str) -> openai.OpenAI:
+        return ClientRegistry.get().get_client(
+            url, self.llm.config["api_key"] or "none"
+        )
+
+    def _get_async_client(self, url: str) -> openai.AsyncOpenAI:
+        return ClientRegistry.get().get_async_client(
+            url, self.llm.config["api_key"] or "none"
+        )
+
+    def _get_ollama_client(self, url: str) -> ollama.Client:
+        return ClientRegistry.get().get_ollama_client(
+            url.removesuffix("/v1"), self.limits.timeout or None
+        )
+
+    def _get_async_ollama_client(self, url: str) -> ollama.AsyncClient:
+        return ClientRegistry.get().get_async_ollama_client(
+            url.removesuffix("/v1"), self.limits.timeout or None
+        )
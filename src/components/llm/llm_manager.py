@@ -39,8 +39,11 @@ class LLMManager(BaseManager):
                 )
             try:
                 llms = [LLM(model=name) for name in llms_names]
+                self._ask_for_endpoints(llms)
+                for llm in llms:
+                    llm.provision()
                 break
-            except httpx.ConnectError:
+            except (ConnectionError, httpx.ConnectError):
                 logger.error("Ollama is not currently running. Please start it.")
                 self.input_m.input_str(
                     "Press Enter when Ollama is running again", optional=True
@@ -60,6 +63,63 @@ class LLMManager(BaseManager):
                 self._ask_for_parameters(llm)
         return llms
 
+    def ask_for_helper_llm(
+        self, purpose: str, env_var: str, default: str = ""
+    ) -> LLM | None:
+        while True:
+            if CustomOS.getenv("APP_MODE", "") == "development":
+                model = CustomOS.getenv(env_var, "")
+            else:
+                model = self.input_m.input_str(
+                    f"Enter the LLM for the {purpose} (empty for the conversation one)",
+                    optional=True,
+                    default=default,
+                )
+            if not model:
+                return None
+            try:
+                llm = LLM(model=model)
+                self._ask_for_endpoints([llm])
+                llm.provision()
+                return llm
+            except (ConnectionError, httpx.ConnectError):
+                logger.error("Ollama is not currently running. Please start it.")
+                self.input_m.input_str(
+                    "Press Enter when Ollama is running again", optional=True
+                )
+            except ollama.ResponseError as e:
+                logger.error(e)
+
+    def _ask_for_endpoints(self, llms: list[LLM]) -> None:
+        ollama_llms = [llm for llm in llms if llm.is_ollama]
+        if not ollama_llms:
+            return
+        if CustomOS.getenv("APP_MODE", "") == "development":
+            endpoints = CustomOS.getenv("OLLAMA_ENDPOINTS", "")
+            if endpoints:
+                for llm in ollama_llms:
+                    llm.set_endpoints(endpoints.split(","))
+            return
+        if not self.input_m.confirm(
+            "Do you want to spread the Ollama LLMs over multiple endpoints?"
+        ):
+            return
+        logger.instruction(
+            instructions=[
+                "Each request goes to the endpoint with the fewest requests in progress",
+                "Unreachable endpoints are skipped until they respond again",
+            ]
+        )
+        default = ""
+        for llm in ollama_llms:
+            endpoints = self.input_m.input_list(
+                message=f"Enter the Ollama endpoints for [{llm.model}]",
+                example="localhost:11434, 192.168.1.20:11434",
+                default=default,
+            )
+            llm.set_endpoints(endpoints)
+            default = ", ".join(endpoints)
+
     def _ask_for_parameters(self, llm: LLM) -> None:
         logger.info(f"Setting parameters for [{llm.model}]")
         llm.temperature = self.input_m.input_float(
@@ -75,4 +135,4 @@ class LLMManager(BaseManager):
             positive_requirement=True,
             max_value=1,
         )
-        llm.create_custom_model()
+        llm.provision(force=True)
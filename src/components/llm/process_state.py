@@ -0,0 +1,27 @@
+import os
+
+from .client_registry import ClientRegistry
+from .endpoint_pool import EndpointPool
+from .live_view import LiveView
+from .llm import LLM
+from .rate_limiter import RateLimiter
+from .resilience import RetryBudget
+from .response_cache import ResponseCache
+
+
+def reset_after_fork() -> None:
+    # A forked worker must not reuse the connections of its parent, nor its
+    # locks, which another thread may have held at the time of the fork
+    for cls in (
+        ClientRegistry,
+        EndpointPool,
+        LiveView,
+        LLM,
+        RateLimiter,
+        RetryBudget,
+        ResponseCache,
+    ):
+        cls.reset()
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
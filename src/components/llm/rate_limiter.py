@@ -0,0 +1,209 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import ClassVar
+
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import DEFAULT_COMPLETION_TOKENS
+from .tokens import count_messages_tokens
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class RateLimiter:
+    # Two token buckets (requests and tokens) refilled continuously
+    key: str
+    rpm: float
+    tpm: float
+    path: Path | None = None
+
+    requests: float = field(init=False)
+    tokens: float = field(init=False)
+    updated: float = field(init=False)
+    paused_until: float = field(default=0.0, init=False)
+    # Running average of the completion length, added to the prompt estimate
+    completion_tokens: float = field(default=DEFAULT_COMPLETION_TOKENS, init=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    connection: sqlite3.Connection | None = field(default=None, init=False)
+
+    instances: ClassVar[dict[str, "RateLimiter | None"]] = {}
+    instances_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __post_init__(self) -> None:
+        self.requests = self.rpm
+        self.tokens = self.tpm
+        self.updated = time.time()
+        if self.path is not None:
+            # The buckets live in SQLite, shared by every process on the machine
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(
+                self.path, check_same_thread=False, timeout=30, isolation_level=None
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL, paused_until REAL NOT NULL)"
+            )
+        logger.debug(
+            f"Rate limiter [{self.key}]: {self.rpm:g} requests and {self.tpm:g} tokens per minute"
+        )
+
+    @classmethod
+    def get(cls, base_url: str, model: str) -> "RateLimiter | None":
+        # One limiter per backend and model, only if limits are configured
+        key = f"{base_url}|{model}"
+        with cls.instances_lock:
+            if key not in cls.instances:
+                limits = cls._get_limits(base_url, model)
+                state_path = os.getenv("RATE_LIMIT_STATE", "")
+                cls.instances[key] = (
+                    cls(
+                        key=key,
+                        rpm=limits[0],
+                        tpm=limits[1],
+                        path=Path(state_path) if state_path else None,
+                    )
+                    if limits is not None
+                    else None
+                )
+            return cls.instances[key]
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.instances = {}
+        cls.instances_lock = threading.Lock()
+
+    def estimate(self, messages: list[dict]) -> int:
+        return count_messages_tokens(messages) + int(self.completion_tokens)
+
+    def wait(self, tokens: int) -> None:
+        while (delay := self._take(tokens)) > 0:
+            time.sleep(delay)
+
+    async def a_wait(self, tokens: int) -> None:
+        while (delay := self._take(tokens)) > 0:
+            await asyncio.sleep(delay)
+
+    def record_usage(
+        self, estimated: int, prompt_tokens: int, completion_tokens: int
+    ) -> None:
+        with self.lock:
+            if completion_tokens:
+                self.completion_tokens = (
+                    0.9 * self.completion_tokens + 0.1 * completion_tokens
+                )
+        used = prompt_tokens + completion_tokens
+        if used:
+            # Give back (or take) the difference from the estimate
+            self._update(
+                lambda state: state.__setitem__(
+                    "tokens", state["tokens"] + estimated - used
+                )
+            )
+
+    def pause(self, seconds: float) -> None:
+        # After a 429 nobody sends until the backend is ready again
+        logger.warning(f"Rate limit hit on [{self.key}], pausing for {seconds:.1f}s")
+        until = time.time() + seconds
+        self._update(
+            lambda state: state.__setitem__(
+                "paused_until", max(state["paused_until"], until)
+            )
+        )
+
+    def _take(self, tokens: int) -> float:
+        # A request larger than the bucket can still go out once it is full
+        tokens = min(tokens, self.tpm)
+        delay = 0.0
+
+        def take(state: dict) -> None:
+            nonlocal delay
+            now = time.time()
+            if state["paused_until"] > now:
+                delay = state["paused_until"] - now
+                return
+            missing_requests = 1 - state["requests"]
+            missing_tokens = tokens - state["tokens"]
+            if missing_requests > 0 or missing_tokens > 0:
+                delay = max(
+                    missing_requests * 60 / self.rpm, missing_tokens * 60 / self.tpm
+                )
+                return
+            state["requests"] -= 1
+            state["tokens"] -= tokens
+
+        self._update(take)
+        return delay
+
+    def _update(self, change) -> None:
+        with self.lock:
+            if self.connection is None:
+                state = self._refill(
+                    {
+                        "requests": self.requests,
+                        "tokens": self.tokens,
+                        "updated": self.updated,
+                        "paused_until": self.paused_until,
+                    }
+                )
+                change(state)
+                self.requests = state["requests"]
+                self.tokens = state["tokens"]
+                self.updated = state["updated"]
+                self.paused_until = state["paused_until"]
+                return
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.connection.execute(
+                    "SELECT requests, tokens, updated, paused_until FROM buckets WHERE key = ?",
+                    (self.key,),
+                ).fetchone()
+                state = self._refill(
+                    dict(zip(("requests", "tokens", "updated", "paused_until"), row))
+                    if row is not None
+                    else {
+                        "requests": self.rpm,
+                        "tokens": self.tpm,
+                        "updated": time.time(),
+                        "paused_until": 0.0,
+                    }
+                )
+                change(state)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO buckets (key, requests, tokens, updated, paused_until) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self.key,
+                        state["requests"],
+                        state["tokens"],
+                        state["updated"],
+                        state["paused_until"],
+                    ),
+                )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def _refill(self, state: dict) -> dict:
+        now = time.time()
+        elapsed = max(0.0, now - state["updated"])
+        state["requests"] = min(self.rpm, state["requests"] + elapsed * self.rpm / 60)
+        state["tokens"] = min(self.tpm, state["tokens"] + elapsed * self.tpm / 60)
+        state["updated"] = now
+        return state
+
+    @classmethod
+    def _get_limits(cls, base_url: str, model: str) -> tuple[float, float] | None:
+        # RATE_LIMITS="gpt-4.1=500:30000,https://host/v1|llama3:latest=60:100000"
+        for entry in os.getenv("RATE_LIMITS", "").split(","):
+            if "=" not in entry:
+                continue
+            target, limits = entry.strip().rsplit("=", 1)
+            if target in (model, f"{base_url}|{model}"):
+                rpm, tpm = limits.split(":")
+                return float(rpm), float(tpm)
+        return None
@@ -0,0 +1,246 @@
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, ClassVar, TypeVar
+
+import httpx
+import ollama
+import openai
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    ENDPOINT_COOLDOWN,
+    MAX_RETRIES,
+    RETRY_BASE_DELAY,
+    RETRY_BUDGET_MIN,
+    RETRY_BUDGET_RATIO,
+    RETRY_MAX_DELAY,
+)
+
+if TYPE_CHECKING:
+    from .endpoint_pool import EndpointPool
+
+logger = ItakelloLogging().get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"Every endpoint of [{name}] is unavailable")
+        self.name = name
+        self.retry_after = retry_after
+
+    def __reduce__(self) -> tuple:
+        return (CircuitOpenError, (self.name, self.retry_after))
+
+
+# Errors meaning the endpoint itself is unreachable
+ENDPOINT_ERRORS = (openai.APIConnectionError, httpx.TransportError, ConnectionError)
+
+# Requests cut by their own timeout: the endpoint is up, the reply is too long
+TIMEOUT_ERRORS = (openai.APITimeoutError, httpx.TimeoutException)
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, ENDPOINT_ERRORS + (CircuitOpenError,)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+    elif isinstance(error, ollama.ResponseError):
+        status = error.status_code
+    elif isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+    else:
+        return False
+    return status == 429 or status >= 500
+
+
+@dataclass
+class CircuitBreaker:
+    # Not thread safe: its owner serialises the calls
+    name: str
+    failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD
+    reset_timeout: float = ENDPOINT_COOLDOWN
+
+    failures: int = field(default=0, init=False)
+    opened_at: float | None = field(default=None, init=False)
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    @property
+    def retry_at(self) -> float:
+        return (self.opened_at or 0.0) + self.reset_timeout
+
+    def record_success(self) -> None:
+        if self.is_open:
+            logger.confirmation(f"[{self.name}] is available again")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self, error: BaseException) -> None:
+        self.failures += 1
+        # An unreachable endpoint opens the circuit right away
+        if (
+            isinstance(error, ENDPOINT_ERRORS) and not isinstance(error, TIMEOUT_ERRORS)
+        ) or self.failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self) -> None:
+        if not self.is_open:
+            logger.warning(f"[{self.name}] is unavailable, routing around it")
+        self.opened_at = time.monotonic()
+
+
+@dataclass
+class RetryBudget:
+    # Retries allowed: a fixed amount plus a share of the requests
+    ratio: float = RETRY_BUDGET_RATIO
+    min_retries: int = RETRY_BUDGET_MIN
+
+    requests: int = field(default=0, init=False)
+    retries: int = field(default=0, init=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    instances: ClassVar[dict[str, "RetryBudget"]] = {}
+    instances_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def get(cls, name: str) -> "RetryBudget":
+        # One budget per name (e.g. a sweep) and process
+        with cls.instances_lock:
+            if name not in cls.instances:
+                cls.instances[name] = cls()
+            return cls.instances[name]
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.instances = {}
+        cls.instances_lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self.lock:
+            self.requests += 1
+
+    def try_spend(self) -> bool:
+        with self.lock:
+            if self.retries >= self.min_retries + self.ratio * self.requests:
+                return False
+            self.retries += 1
+            return True
+
+
+@dataclass
+class Resilience:
+    budget: RetryBudget | None = None
+    max_attempts: int = MAX_RETRIES
+    base_delay: float = RETRY_BASE_DELAY
+    max_delay: float = RETRY_MAX_DELAY
+
+    def call(
+        self,
+        request: Callable[[str | None], T],
+        pool: "EndpointPool | None" = None,
+        retry_timeouts: bool = True,
+    ) -> T:
+        if self.budget is not None:
+            self.budget.record_request()
+        attempt = 0
+        while True:
+            try:
+                return self._attempt(request, pool)
+            except Exception as e:
+                attempt += 1
+                if not self._should_retry(e, attempt, retry_timeouts):
+                    raise
+                time.sleep(self._get_delay(e, attempt, pool))
+
+    async def a_call(
+        self,
+        request: Callable[[str | None], Awaitable[T]],
+        pool: "EndpointPool | None" = None,
+        retry_timeouts: bool = True,
+    ) -> T:
+        if self.budget is not None:
+            self.budget.record_request()
+        attempt = 0
+        while True:
+            try:
+                return await self._a_attempt(request, pool)
+            except Exception as e:
+                attempt += 1
+                if not self._should_retry(e, attempt, retry_timeouts):
+                    raise
+                await asyncio.sleep(self._get_delay(e, attempt, pool))
+
+    def _attempt(
+        self, request: Callable[[str | None], T], pool: "EndpointPool | None"
+    ) -> T:
+        if pool is None:
+            return request(None)
+        with pool.acquire() as url:
+            try:
+                result = request(url)
+            except Exception as e:
+                pool.record_failure(url, e)
+                raise
+            pool.record_success(url)
+            return result
+
+    async def _a_attempt(
+        self,
+        request: Callable[[str | None], Awaitable[T]],
+        pool: "EndpointPool | None",
+    ) -> T:
+        if pool is None:
+            return await request(None)
+        with pool.acquire() as url:
+            try:
+                result = await request(url)
+            except Exception as e:
+                pool.record_failure(url, e)
+                raise
+            pool.record_success(url)
+            return result
+
+    def _should_retry(
+        self, error: Exception, attempt: int, retry_timeouts: bool
+    ) -> bool:
+        if not is_transient(error):
+            return False
+        # A timeout chosen by the caller bounds the whole call, not each attempt
+        if not retry_timeouts and isinstance(error, TIMEOUT_ERRORS):
+            logger.error(f"LLM request timed out: {error}")
+            return False
+        if attempt >= self.max_attempts:
+            logger.error(f"LLM request failed after {attempt} attempts: {error}")
+            return False
+        if self.budget is not None and not self.budget.try_spend():
+            logger.error(f"Retry budget exhausted, LLM request failed: {error}")
+            return False
+        logger.warning(
+            f"Error during LLM request (attempt {attempt}/{self.max_attempts}): {error}. Retrying..."
+        )
+        return True
+
+    def _get_delay(
+        self, error: Exception, attempt: int, pool: "EndpointPool | None"
+    ) -> float:
+        if isinstance(error, CircuitOpenError):
+            return error.retry_after
+        # An unreachable endpoint is skipped right away if another one is available
+        if (
+            isinstance(error, ENDPOINT_ERRORS)
+            and not isinstance(error, TIMEOUT_ERRORS)
+            and pool is not None
+            and pool.has_available()
+        ):
+            return 0.0
+        # Full jitter, so that parallel conversations do not retry in sync
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import ClassVar
+
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import (
+    RESPONSE_CACHE_EVICTION_TARGET,
+    RESPONSE_CACHE_MAX_ENTRIES,
+)
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class ResponseCache:
+    path: Path
+    max_entries: int = RESPONSE_CACHE_MAX_ENTRIES
+
+    connection: sqlite3.Connection = field(init=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+    # Upper bound of the rows, other processes may have added or evicted some
+    n_entries: int = field(default=0, init=False)
+
+    instances: ClassVar[dict[tuple[str, int], "ResponseCache"]] = {}
+    instances_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __post_init__(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(
+            self.path, check_same_thread=False, timeout=30
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self.connection.commit()
+        self.n_entries = self._count()
+        logger.debug(f"Response cache opened at {self.path} [{self.n_entries} entries]")
+
+    @classmethod
+    def open(cls, path: str) -> "ResponseCache":
+        # One connection per process, shared by all the threads and coroutines
+        instance_key = (path, os.getpid())
+        with cls.instances_lock:
+            if instance_key not in cls.instances:
+                cls.instances[instance_key] = cls(path=Path(path))
+            return cls.instances[instance_key]
+
+    @classmethod
+    def reset(cls) -> None:
+        cls.instances = {}
+        cls.instances_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, params: dict, messages: list[dict]) -> str:
+        payload = json.dumps(
+            {"model": model, "params": params, "messages": messages},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self.connection.commit()
+        logger.debug(f"Response cache hit [{key[:12]}]")
+        return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, last_access) VALUES (?, ?, ?)",
+                (key, response, time.time()),
+            )
+            self.n_entries += 1
+            if self.n_entries > self.max_entries:
+                self._evict()
+            self.connection.commit()
+
+    def _evict(self) -> None:
+        # Only once over the limit, then in a batch of the least recently used
+        self.n_entries = self._count()
+        if self.n_entries <= self.max_entries:
+            return
+        target = int(self.max_entries * RESPONSE_CACHE_EVICTION_TARGET)
+        self.connection.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+            (self.n_entries - target,),
+        )
+        logger.debug(f"Response cache: evicted {self.n_entries - target} entries")
+        self.n_entries = target
+
+    def _count(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -0,0 +1,14 @@
+from ...utility.consts import CHARS_PER_TOKEN, MESSAGE_TOKEN_OVERHEAD
+
+
+def count_tokens(text: str) -> int:
+    # Character heuristic: exact tokenizers differ between models and backends
+    return len(text) // CHARS_PER_TOKEN
+
+
+def count_message_tokens(message: dict) -> int:
+    return count_tokens(str(message.get("content") or "")) + MESSAGE_TOKEN_OVERHEAD
+
+
+def count_messages_tokens(messages: list[dict]) -> int:
+    return sum(count_message_tokens(message) for message in messages)
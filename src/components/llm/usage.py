@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+
+from ...interfaces.mongo_model import MongoModel
+
+
+@dataclass
+class Usage(MongoModel):
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: int, completion_tokens: int, latency: float) -> None:
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.latency += latency
+
+    def __add__(self, other: "Usage") -> "Usage":
+        return Usage(
+            requests=self.requests + other.requests,
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            completion_tokens=self.completion_tokens + other.completion_tokens,
+            latency=self.latency + other.latency,
+        )
+
+    def __str__(self) -> str:
+        average_latency = self.latency / self.requests if self.requests else 0.0
+        return (
+            f"{self.requests} requests | Prompt tokens: {self.prompt_tokens} | "
+            + f"Completion tokens: {self.completion_tokens} | "
+            + f"Total tokens: {self.total_tokens} | "
+            + f"Average latency: {average_latency:.2f}s"
+        )
+
+    @classmethod
+    def from_document(cls, doc: dict) -> "Usage":
+        return cls(
+            requests=doc.get("requests", 0),
+            prompt_tokens=doc.get("prompt_tokens", 0),
+            completion_tokens=doc.get("completion_tokens", 0),
+            latency=doc.get("latency", 0.0),
+        )
+
+    def to_document(self) -> dict:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency": self.latency,
+        }
@@ -3,6 +3,7 @@ from dataclasses import dataclass, field
 from itakello_logging import ItakelloLogging
 
 from ...interfaces.mongo_model import MongoModel
+from ..llm.generation_limits import GenerationLimits
 from ..placeholder.placeholder import Placeholder
 from ..section.section import Section
 
@@ -14,14 +15,27 @@ class Role(MongoModel):
     name: str
     sections: dict[str, Section] = field(default_factory=dict)
     placeholders: dict[str, Placeholder] = field(default_factory=dict)
+    # Generation limits of the agents with this role, 0 for none
+    max_tokens: int = 0
+    stop_sequences: list[str] = field(default_factory=list)
+    stop_at_other_roles: bool = False
+    timeout: float = 0.0
 
     def __init__(
         self,
         name: str,
         sections: list[Section],
         placeholders: list[Placeholder] = [],
+        max_tokens: int = 0,
+        stop_sequences: list[str] = [],
+        stop_at_other_roles: bool = False,
+        timeout: float = 0.0,
     ) -> None:
         self.name = name
+        self.max_tokens = max_tokens
+        self.stop_sequences = list(stop_sequences)
+        self.stop_at_other_roles = stop_at_other_roles
+        self.timeout = timeout
         self.sections = {section.title: section for section in sections}
         if not placeholders:
             placeholders = self._create_starting_placeholders()
@@ -44,6 +58,7 @@ class Role(MongoModel):
             + f"\033[1mName\033[0m: {self.name}\n\n"
             + f"\033[1mPrivate sections\033[0m:\n-----\n{sections}-----\n\n"
             + f"\033[1mPlaceholders\033[0m:\n- {placeholders}\n"
+            + f"\033[1mGeneration limits\033[0m: {self._limits_to_str()}\n"
             + "----------------------------------------"
         )
 
@@ -56,6 +71,10 @@ class Role(MongoModel):
                 Placeholder.from_document(placeholder)
                 for placeholder in doc["placeholders"]
             ],
+            max_tokens=doc.get("max_tokens", 0),
+            stop_sequences=doc.get("stop_sequences", []),
+            stop_at_other_roles=doc.get("stop_at_other_roles", False),
+            timeout=doc.get("timeout", 0.0),
         )
 
     def to_document(self) -> dict:
@@ -65,8 +84,34 @@ class Role(MongoModel):
             "placeholders": [
                 placeholder.to_document() for placeholder in self.placeholders.values()
             ],
+            "max_tokens": self.max_tokens,
+            "stop_sequences": self.stop_sequences,
+            "stop_at_other_roles": self.stop_at_other_roles,
+            "timeout": self.timeout,
         }
 
+    def get_limits(self, other_roles: list[str]) -> GenerationLimits:
+        stop = list(self.stop_sequences)
+        if self.stop_at_other_roles:
+            # Agents are named <Role>_<number>: a new line starting with another
+            # role means the agent is writing its lines
+            stop += [f"\n{role.capitalize()}_" for role in other_roles]
+        return GenerationLimits(
+            max_tokens=self.max_tokens, stop=stop, timeout=self.timeout
+        )
+
+    def _limits_to_str(self) -> str:
+        limits = []
+        if self.max_tokens:
+            limits.append(f"max {self.max_tokens} tokens")
+        if self.stop_sequences:
+            limits.append(f"stop sequences {self.stop_sequences}")
+        if self.stop_at_other_roles:
+            limits.append("stop at other roles")
+        if self.timeout:
+            limits.append(f"timeout {self.timeout:g}s")
+        return ", ".join(limits) or "none"
+
     def print_placeholders(self) -> None:
         placeholders = "\n".join(
             [str(placeholder) for placeholder in self.placeholders.values()]
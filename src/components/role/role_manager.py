@@ -21,7 +21,10 @@ class RoleManager(BaseManager):
     placeholder_m: PlaceholderManager
 
     def ask_for_roles(
-        self, private_sections: list[Section], default="guard, prisoner"
+        self,
+        private_sections: list[Section],
+        default="guard, prisoner",
+        old_roles: dict[str, Role] = {},
     ) -> list[Role]:
         assert all(
             section.type == SectionType.PRIVATE for section in private_sections
@@ -44,6 +47,7 @@ class RoleManager(BaseManager):
                 sections=role_sections,
             )
             roles.append(new_role)
+        self._ask_for_limits(roles, old_roles)
         return roles
 
     def ask_for_updated_roles(self, old_roles: dict[str, Role]) -> list[Role]:
@@ -57,13 +61,60 @@ class RoleManager(BaseManager):
         old_private_sections_copy = self.get_private_sections_copy(old_roles)
 
         new_roles = self.ask_for_roles(
-            old_private_sections_copy, default=", ".join(old_roles.keys())
+            old_private_sections_copy,
+            default=", ".join(old_roles.keys()),
+            old_roles=old_roles,
         )
         for role in new_roles:
             if role.name in old_roles:
                 role.sections = old_roles[role.name].sections
         return new_roles
 
+    def _ask_for_limits(self, roles: list[Role], old_roles: dict[str, Role]) -> None:
+        for role in roles:
+            if role.name in old_roles:
+                old_role = old_roles[role.name]
+                role.max_tokens = old_role.max_tokens
+                role.stop_sequences = old_role.stop_sequences
+                role.stop_at_other_roles = old_role.stop_at_other_roles
+                role.timeout = old_role.timeout
+        if CustomOS.getenv("APP_MODE", "") == "development":
+            for role in roles:
+                role.max_tokens = int(CustomOS.getenv("ROLE_MAX_TOKENS", "0"))
+                role.stop_at_other_roles = (
+                    CustomOS.getenv("ROLE_STOP_AT_OTHER_ROLES", "n") == "y"
+                )
+                role.timeout = float(CustomOS.getenv("ROLE_TIMEOUT", "0"))
+            return
+        if not self.input_m.confirm(
+            "Do you want to set the generation limits of the roles?"
+        ):
+            return
+        logger.instruction(
+            instructions=[
+                "Limits bound the length and the latency of each reply, 0 means no limit",
+                "Stopping at the other roles cuts a reply when it starts writing the lines of another agent",
+            ]
+        )
+        for role in roles:
+            role.max_tokens = self.input_m.input_int(
+                f"[{role.name}] Enter the maximum number of tokens per reply",
+                default=str(role.max_tokens),
+            )
+            role.stop_sequences = self.input_m.input_list(
+                f"[{role.name}] Enter the stop sequences",
+                optional=True,
+                default=", ".join(role.stop_sequences),
+            )
+            role.stop_at_other_roles = self.input_m.confirm(
+                f"[{role.name}] Do you want to stop the replies at the lines of the other roles?"
+            )
+            role.timeout = self.input_m.input_float(
+                f"[{role.name}] Enter the timeout of a reply in seconds",
+                positive_requirement=True,
+                default=str(role.timeout),
+            )
+
     def get_private_sections_copy(self, roles: dict[str, Role]) -> list[Section]:
         private_sections_copy = deepcopy(
             list(list(roles.values())[0].sections.values())
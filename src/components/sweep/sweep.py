@@ -0,0 +1,151 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from itakello_logging import ItakelloLogging
+
+from ...interfaces.mongo_model import MongoModel
+from ...utility.consts import TIME_FORMAT
+from ...utility.enums import SpeakerSelectorType, SweepStatus
+from ..llm.llm import LLM
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class SweepCell(MongoModel):
+    index: int
+    llm: str
+    days: int
+    agent_combination: list[tuple[str, int]]
+    replicate: int
+    status: SweepStatus = SweepStatus.PENDING
+    conversation_id: ObjectId | None = None
+
+    @classmethod
+    def from_document(cls, doc: dict) -> "SweepCell":
+        return cls(
+            index=doc["index"],
+            llm=doc["llm"],
+            days=doc["days"],
+            agent_combination=[tuple(pair) for pair in doc["agent_combination"]],
+            replicate=doc["replicate"],
+            status=SweepStatus(doc["status"]),
+            conversation_id=doc["conversation_id"],
+        )
+
+    def to_document(self) -> dict:
+        return {
+            "index": self.index,
+            "llm": self.llm,
+            "days": self.days,
+            "agent_combination": self.agent_combination,
+            "replicate": self.replicate,
+            "status": self.status.value,
+            "conversation_id": self.conversation_id,
+        }
+
+
+@dataclass
+class Sweep(MongoModel):
+    experiment_id: ObjectId
+    n_messages: int
+    speaker_selection_method: str
+    creator: str
+    use_cache: bool = False
+    # Maximum prompt tokens per request, 0 to send the whole history
+    context_budget: int = 0
+    # How the next speaker is chosen in auto mode
+    speaker_selector: SpeakerSelectorType = SpeakerSelectorType.LLM
+    selector_llm: LLM | None = None
+    # Conversations end early on a matching message or on the judge verdict
+    stop_patterns: list[str] = field(default_factory=list)
+    stop_judge: str = ""
+    judge_llm: LLM | None = None
+    cells: list[SweepCell] = field(default_factory=list)
+    id: ObjectId = field(default_factory=ObjectId)
+    creation_date: datetime = field(default_factory=datetime.now)
+
+    def __post_init__(self) -> None:
+        logger.debug(f"Created a new Sweep with {len(self.cells)} cells")
+
+    def add_cell(
+        self,
+        llm: str,
+        days: int,
+        agent_combination: list[tuple[str, int]],
+        replicate: int,
+    ) -> None:
+        self.cells.append(
+            SweepCell(
+                index=len(self.cells),
+                llm=llm,
+                days=days,
+                agent_combination=agent_combination,
+                replicate=replicate,
+            )
+        )
+
+    def get_remaining_cells(self) -> list[SweepCell]:
+        return [cell for cell in self.cells if cell.status != SweepStatus.DONE]
+
+    def to_selection(self) -> str:
+        counts = {status: 0 for status in SweepStatus}
+        for cell in self.cells:
+            counts[cell.status] += 1
+        selection = (
+            f"Creator: {self.creator}  [{self.creation_date.strftime(TIME_FORMAT)}]\t"
+            + f"Messages: {self.n_messages}\t"
+            + f"Speaker selection method: {self.speaker_selection_method}\t"
+            + "\t".join(
+                f"{status.value.capitalize()}: {num}" for status, num in counts.items()
+            )
+        )
+        return selection
+
+    @classmethod
+    def from_document(cls, doc: dict) -> "Sweep":
+        return cls(
+            id=doc["_id"],
+            experiment_id=doc["experiment_id"],
+            n_messages=doc["n_messages"],
+            speaker_selection_method=doc["speaker_selection_method"],
+            creator=doc["creator"],
+            use_cache=doc.get("use_cache", False),
+            context_budget=doc.get("context_budget", 0),
+            speaker_selector=SpeakerSelectorType(
+                doc.get("speaker_selector", SpeakerSelectorType.LLM.value)
+            ),
+            selector_llm=(
+                LLM.from_document(doc["selector_llm"])
+                if doc.get("selector_llm")
+                else None
+            ),
+            stop_patterns=doc.get("stop_patterns", []),
+            stop_judge=doc.get("stop_judge", ""),
+            judge_llm=(
+                LLM.from_document(doc["judge_llm"]) if doc.get("judge_llm") else None
+            ),
+            cells=[SweepCell.from_document(cell) for cell in doc["cells"]],
+            creation_date=doc["creation_date"],
+        )
+
+    def to_document(self) -> dict:
+        return {
+            "_id": self.id,
+            "experiment_id": self.experiment_id,
+            "n_messages": self.n_messages,
+            "speaker_selection_method": self.speaker_selection_method,
+            "creator": self.creator,
+            "use_cache": self.use_cache,
+            "context_budget": self.context_budget,
+            "speaker_selector": self.speaker_selector.value,
+            "selector_llm": (
+                self.selector_llm.to_document() if self.selector_llm else None
+            ),
+            "stop_patterns": self.stop_patterns,
+            "stop_judge": self.stop_judge,
+            "judge_llm": self.judge_llm.to_document() if self.judge_llm else None,
+            "cells": [cell.to_document() for cell in self.cells],
+            "creation_date": self.creation_date,
+        }
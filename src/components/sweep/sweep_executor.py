@@ -0,0 +1,276 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from multiprocessing import Manager
+from queue import Empty, Queue
+
+from itakello_logging import ItakelloLogging
+
+from ...core.database_manager import DatabaseManager
+from ...core.write_batch import WriteBatch
+from ...interfaces import BaseManager
+from ...utility.consts import (
+    DEFAULT_BACKEND_CONCURRENCY,
+    DEFAULT_MAX_RESIDENT_MODELS,
+    DEFAULT_SWEEP_WORKERS,
+    DEFAULT_WRITE_BATCH_SIZE,
+    DEFAULT_WRITE_MAX_LATENCY,
+    FLUSH_POLL_INTERVAL,
+)
+from ...utility.enums import ConversationStatus, StreamMode, SweepStatus
+from ..conversation.lockstep_barrier import LockstepBarrier
+from ..experiment.experiment import Experiment
+from ..llm import process_state  # noqa: F401  (resets the state of forked workers)
+from .sweep import Sweep
+from .sweep_job import SweepJob
+from .sweep_scheduler import SweepScheduler
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+def _run_in_process(job: SweepJob, flush_queue: Queue, flush_every_turn: bool) -> None:
+    # Some client errors cannot be unpickled in the parent, which breaks the pool
+    try:
+        job.run(flush_queue, flush_every_turn)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+
+@dataclass
+class SweepExecutor(BaseManager):
+    db_m: DatabaseManager
+    workers: int = DEFAULT_SWEEP_WORKERS
+    mode: str = "thread"
+    backend_limits: dict[str, int] = field(default_factory=dict)
+    flush_every_turn: bool = False
+    lockstep: bool = False
+    max_resident_models: int = DEFAULT_MAX_RESIDENT_MODELS
+    stream: StreamMode = StreamMode.OFF
+    write_batch_size: int = DEFAULT_WRITE_BATCH_SIZE
+    write_max_latency: float = DEFAULT_WRITE_MAX_LATENCY
+
+    batch: WriteBatch = field(init=False)
+
+    def __post_init__(self) -> None:
+        assert self.mode in ("thread", "process", "async"), logger.error(
+            f"Invalid sweep mode [{self.mode}]"
+        )
+        self.batch = WriteBatch(
+            max_size=self.write_batch_size, max_latency=self.write_max_latency
+        )
+        super().__post_init__()
+
+    def run(self, experiment: Experiment, sweep: Sweep) -> int:
+        jobs = self._create_jobs(experiment, sweep)
+        for pool in {id(job.llm.pool): job.llm.pool for job in jobs}.values():
+            pool.check_health()
+        scheduler = SweepScheduler(
+            jobs=jobs, max_resident_models=self.max_resident_models
+        )
+        try:
+            if self.mode == "async":
+                return asyncio.run(self._run_async(experiment, sweep, jobs, scheduler))
+            return self._run_pool(experiment, sweep, jobs, scheduler)
+        finally:
+            self.db_m.save_batch(self.batch)
+
+    def _run_pool(
+        self,
+        experiment: Experiment,
+        sweep: Sweep,
+        jobs: list[SweepJob],
+        scheduler: SweepScheduler,
+    ) -> int:
+        in_flight: dict[Future, SweepJob] = {}
+        running: dict[str, int] = defaultdict(int)
+        completed = 0
+        start = time.monotonic()
+        with ExitStack() as stack:
+            pool = stack.enter_context(self._create_pool())
+            flush_queue = self._create_queue(stack)
+            while scheduler.has_pending() or in_flight:
+                for job in self._next_jobs(scheduler, running, len(in_flight)):
+                    self._start_job(sweep, job)
+                    in_flight[
+                        pool.submit(
+                            _run_in_process if self.mode == "process" else SweepJob.run,
+                            job,
+                            flush_queue,
+                            self.flush_every_turn,
+                        )
+                    ] = job
+                done, _ = wait(
+                    in_flight, timeout=FLUSH_POLL_INTERVAL, return_when=FIRST_COMPLETED
+                )
+                self._save_flushed(experiment, sweep, flush_queue)
+                for future in done:
+                    job = in_flight.pop(future)
+                    running[job.backend] -= 1
+                    scheduler.finish(job)
+                    if self._finish_job(sweep, job, future.exception()):
+                        completed += 1
+                        self._log_throughput(completed, len(jobs), start)
+        return completed
+
+    async def _run_async(
+        self,
+        experiment: Experiment,
+        sweep: Sweep,
+        jobs: list[SweepJob],
+        scheduler: SweepScheduler,
+    ) -> int:
+        flush_queue: Queue = Queue()
+        barriers = {
+            job.lockstep_key: LockstepBarrier(name=job.lockstep_key)
+            for job in jobs
+            if self.lockstep
+        }
+        in_flight: dict[asyncio.Task, SweepJob] = {}
+        running: dict[str, int] = defaultdict(int)
+        completed = 0
+        start = time.monotonic()
+        while scheduler.has_pending() or in_flight:
+            new_jobs = self._next_jobs(scheduler, running, len(in_flight))
+            # Every replicate joins before any of them takes its first turn
+            for job in new_jobs:
+                if job.lockstep_key in barriers:
+                    barriers[job.lockstep_key].join()
+            for job in new_jobs:
+                self._start_job(sweep, job)
+                task = asyncio.create_task(
+                    job.a_run(
+                        flush_queue,
+                        self.flush_every_turn,
+                        barriers.get(job.lockstep_key),
+                    )
+                )
+                in_flight[task] = job
+            done, _ = await asyncio.wait(
+                in_flight, timeout=FLUSH_POLL_INTERVAL, return_when=FIRST_COMPLETED
+            )
+            await asyncio.to_thread(self._save_flushed, experiment, sweep, flush_queue)
+            for task in done:
+                job = in_flight.pop(task)
+                running[job.backend] -= 1
+                scheduler.finish(job)
+                if self._finish_job(sweep, job, task.exception()):
+                    completed += 1
+                    self._log_throughput(completed, len(jobs), start)
+        return completed
+
+    def _next_jobs(
+        self, scheduler: SweepScheduler, running: dict[str, int], n_in_flight: int
+    ) -> list[SweepJob]:
+        jobs = []
+        while n_in_flight + len(jobs) < self.workers:
+            job = scheduler.next_job(
+                lambda job: running[job.backend] < self._get_backend_limit(job)
+            )
+            if job is None:
+                break
+            running[job.backend] += 1
+            jobs.append(job)
+        return jobs
+
+    def _start_job(self, sweep: Sweep, job: SweepJob) -> None:
+        job.cell.status = SweepStatus.RUNNING
+        self.batch.add_cell(sweep, job.cell)
+        logger.info(
+            f"--- Performing conversation [{job.index}/{len(sweep.cells)}] ---\n"
+        )
+        logger.info(job.describe())
+
+    def _finish_job(
+        self, sweep: Sweep, job: SweepJob, error: BaseException | None
+    ) -> bool:
+        if error is not None:
+            logger.error(f"Conversation [{job.index}] failed: {error}")
+            job.cell.status = SweepStatus.FAILED
+        else:
+            job.cell.status = SweepStatus.DONE
+        self.batch.add_cell(sweep, job.cell)
+        return error is None
+
+    def _create_jobs(self, experiment: Experiment, sweep: Sweep) -> list[SweepJob]:
+        jobs = []
+        for cell in sweep.get_remaining_cells():
+            conversation = None
+            if cell.conversation_id is not None:
+                conversation = self.db_m.get_conversation(cell.conversation_id)
+            if (
+                conversation is not None
+                and conversation.id not in experiment.conversation_ids
+            ):
+                # Saved just before a crash, the experiment doesn't list it yet
+                self.batch.add_conversation(experiment, conversation, [])
+            if (
+                conversation is not None
+                and conversation.status == ConversationStatus.COMPLETED
+            ):
+                cell.status = SweepStatus.DONE
+                self.db_m.update_sweep_cell(sweep, cell)
+                continue
+            if conversation is not None:
+                self.db_m.discard_partial_day(conversation)
+                logger.info(
+                    f"Conversation [{cell.index + 1}] continues from day {conversation.completed_days + 1}"
+                )
+            jobs.append(
+                SweepJob(
+                    experiment=experiment,
+                    sweep=sweep,
+                    cell=cell,
+                    conversation=conversation,
+                    stream=self.stream,
+                )
+            )
+        return jobs
+
+    def _save_flushed(
+        self, experiment: Experiment, sweep: Sweep, flush_queue: Queue
+    ) -> None:
+        while True:
+            try:
+                cell_index, conversation, messages = flush_queue.get_nowait()
+            except Empty:
+                break
+            cell = sweep.cells[cell_index]
+            self.batch.add_conversation(experiment, conversation, messages)
+            if cell.conversation_id != conversation.id:
+                cell.conversation_id = conversation.id
+                self.batch.add_cell(sweep, cell)
+        if self.batch.is_due():
+            self.db_m.save_batch(self.batch)
+
+    def _create_queue(self, stack: ExitStack) -> Queue:
+        if self.mode == "process":
+            return stack.enter_context(Manager()).Queue()
+        return Queue()
+
+    def _create_pool(self) -> Executor:
+        if self.mode == "process":
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def _get_backend_limit(self, job: SweepJob) -> int:
+        # Every endpoint of a pool adds its own share of concurrency
+        return self.backend_limits.get(
+            job.backend, DEFAULT_BACKEND_CONCURRENCY * len(job.llm.endpoints)
+        )
+
+    def _log_throughput(self, completed: int, total: int, start: float) -> None:
+        elapsed_hours = (time.monotonic() - start) / 3600
+        throughput = completed / elapsed_hours if elapsed_hours else 0.0
+        logger.info(
+            f"Completed [{completed}/{total}] conversations ({throughput:.1f} conversations/hour)"
+        )
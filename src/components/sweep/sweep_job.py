@@ -0,0 +1,244 @@
+from copy import deepcopy
+from dataclasses import dataclass
+from queue import Queue
+from typing import Callable
+
+from itakello_logging import ItakelloLogging
+
+from ..conversation.agent import CustomAgent
+from ..conversation.conversation import Conversation
+from ..conversation.lockstep_barrier import LockstepBarrier
+from ..conversation.message import Message
+from ..conversation.speaker_selector import (
+    CachedSpeakerSelector,
+    LLMSpeakerSelector,
+    RuleSpeakerSelector,
+    SpeakerSelector,
+)
+from ..conversation.summarizer import Summarizer
+from ..conversation.stop_condition import (
+    JudgeStopCondition,
+    PatternStopCondition,
+    StopCondition,
+)
+from ...utility.consts import RESPONSE_CACHE_PATH
+from ...utility.enums import SpeakerSelectorType, StreamMode
+from ..experiment.experiment import Experiment
+from ..llm.context_budget import ContextBudget
+from ..llm.llm import LLM
+from ..llm.llm_client import LLMClient
+from ..llm.resilience import Resilience, RetryBudget
+from ..llm.response_cache import ResponseCache
+from .sweep import Sweep, SweepCell
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class SweepJob:
+    experiment: Experiment
+    sweep: Sweep
+    cell: SweepCell
+    conversation: Conversation | None = None
+    stream: StreamMode = StreamMode.OFF
+
+    @property
+    def index(self) -> int:
+        return self.cell.index + 1
+
+    @property
+    def llm(self) -> LLM:
+        return self.experiment.llms[self.cell.llm]
+
+    @property
+    def speaker_selection_llm(self) -> LLM:
+        return self.experiment.speaker_selection_llm or self.llm
+
+    @property
+    def selector_llm(self) -> LLM | None:
+        # The model choosing the speakers, if any
+        selector_type = self.sweep.speaker_selector
+        if (
+            self.sweep.speaker_selection_method != "auto"
+            or selector_type == SpeakerSelectorType.RULES
+        ):
+            return None
+        if selector_type == SpeakerSelectorType.LLM:
+            return self.speaker_selection_llm
+        return self.sweep.selector_llm or self.speaker_selection_llm
+
+    @property
+    def judge_llm(self) -> LLM | None:
+        if not self.sweep.stop_judge:
+            return None
+        return self.sweep.judge_llm or self.llm
+
+    @property
+    def llms(self) -> list[LLM]:
+        # Every model the conversation sends requests to, helpers included
+        llms = {}
+        for llm in (
+            self.llm,
+            self.experiment.summarizer_llm or self.llm,
+            self.selector_llm,
+            self.judge_llm,
+        ):
+            if llm is not None:
+                llms.setdefault((llm.backend, llm.config["model"]), llm)
+        return list(llms.values())
+
+    @property
+    def backend(self) -> str:
+        return self.llm.backend
+
+    @property
+    def resilience(self) -> Resilience:
+        # The retry budget is shared by the whole sweep (per process)
+        return Resilience(budget=RetryBudget.get(str(self.sweep.id)))
+
+    @property
+    def context_budget(self) -> ContextBudget | None:
+        if not self.sweep.context_budget:
+            return None
+        return ContextBudget(max_tokens=self.sweep.context_budget)
+
+    @property
+    def model_key(self) -> str:
+        return f"{self.backend}|{self.llm.config['model']}"
+
+    @property
+    def lockstep_key(self) -> str:
+        return f"{self.cell.llm}|{self.cell.days}|{self.cell.agent_combination}"
+
+    def describe(self) -> str:
+        return f"\033[1mLLM\033[0m: {self.llm}\n\033[1mDays\033[0m: {self.cell.days}\n\033[1mAgents\033[0m: {self.cell.agent_combination}\n"
+
+    def run(self, flush_queue: Queue, flush_every_turn: bool = False) -> Conversation:
+        conversation, conv_agents, summarizer, speaker_selector = self._prepare()
+        stop_conditions = self._get_stop_conditions()
+        conversation.perform(
+            agents=conv_agents,
+            summarizer=summarizer,
+            llm_manager=self.speaker_selection_llm,
+            on_flush=self._get_flush_callback(flush_queue),
+            flush_every_turn=flush_every_turn,
+            resilience=self.resilience,
+            context_budget=self.context_budget,
+            speaker_selector=speaker_selector,
+            stop_conditions=stop_conditions,
+        )
+        return conversation
+
+    async def a_run(
+        self,
+        flush_queue: Queue,
+        flush_every_turn: bool = False,
+        barrier: LockstepBarrier | None = None,
+    ) -> Conversation:
+        # The barrier is joined by the executor, before any replicate starts
+        try:
+            conversation, conv_agents, summarizer, speaker_selector = self._prepare()
+            stop_conditions = self._get_stop_conditions()
+            await conversation.a_perform(
+                agents=conv_agents,
+                summarizer=summarizer,
+                llm_manager=self.speaker_selection_llm,
+                on_flush=self._get_flush_callback(flush_queue),
+                flush_every_turn=flush_every_turn,
+                barrier=barrier,
+                resilience=self.resilience,
+                context_budget=self.context_budget,
+                speaker_selector=speaker_selector,
+                stop_conditions=stop_conditions,
+            )
+        finally:
+            if barrier is not None:
+                barrier.leave()
+        return conversation
+
+    def _prepare(
+        self,
+    ) -> tuple[Conversation, list[CustomAgent], Summarizer, SpeakerSelector | None]:
+        conversation = self.conversation or Conversation(
+            n_messages=self.sweep.n_messages,
+            speaker_selection_method=self.sweep.speaker_selection_method,
+            starting_message=self.experiment.starting_message,
+            creator=self.sweep.creator,
+            experiment_id=self.experiment.id,
+            days=self.cell.days,
+            llm=self.llm,
+            agent_combination=self.cell.agent_combination,
+        )
+        placeholders = self.experiment.compose_placeholders(self.cell.agent_combination)
+        cache = (
+            ResponseCache.open(RESPONSE_CACHE_PATH) if self.sweep.use_cache else None
+        )
+        conv_agents = conversation.generate_agents(
+            self.experiment,
+            placeholders,
+            name_seed=(
+                f"{self.lockstep_key}|{self.cell.replicate}"
+                if self.sweep.use_cache
+                else ""
+            ),
+            cache=cache,
+            resilience=self.resilience,
+            stream=self.stream,
+        )
+        summarizer = Summarizer(
+            sections=list(self.experiment.summarizer_sections.values()),
+            placeholders=placeholders,
+            llm=self.experiment.summarizer_llm or self.llm,
+            cache=cache,
+            resilience=self.resilience,
+            stream=self.stream,
+        )
+        return (
+            conversation,
+            conv_agents,
+            summarizer,
+            self._get_speaker_selector(cache),
+        )
+
+    def _get_speaker_selector(
+        self, cache: ResponseCache | None
+    ) -> SpeakerSelector | None:
+        if self.sweep.speaker_selection_method != "auto":
+            return None
+        selector_type = self.sweep.speaker_selector
+        if selector_type == SpeakerSelectorType.RULES:
+            return RuleSpeakerSelector()
+        selector = LLMSpeakerSelector(
+            llm_client=LLMClient(
+                llm=self.selector_llm,  # type: ignore
+                cache=cache,
+                resilience=self.resilience,
+            )
+        )
+        if selector_type == SpeakerSelectorType.CACHED:
+            return CachedSpeakerSelector(selector=selector)
+        return selector
+
+    def _get_stop_conditions(self) -> list[StopCondition]:
+        stop_conditions: list[StopCondition] = [
+            PatternStopCondition(pattern=pattern)
+            for pattern in self.sweep.stop_patterns
+        ]
+        if self.sweep.stop_judge:
+            stop_conditions.append(
+                JudgeStopCondition(
+                    llm_client=LLMClient(
+                        llm=self.judge_llm,  # type: ignore
+                        resilience=self.resilience,
+                    ),
+                    state=self.sweep.stop_judge,
+                )
+            )
+        return stop_conditions
+
+    def _get_flush_callback(
+        self, flush_queue: Queue
+    ) -> Callable[[Conversation, list[Message]], None]:
+        return lambda conversation, messages: flush_queue.put(
+            (self.cell.index, deepcopy(conversation), messages)
+        )
@@ -0,0 +1,114 @@
+import threading
+from collections import defaultdict, deque
+from dataclasses import InitVar, dataclass, field
+from typing import Callable
+
+from itakello_logging import ItakelloLogging
+
+from ...utility.consts import DEFAULT_MAX_RESIDENT_MODELS, PREWARM_KEEP_ALIVE
+from ..llm.llm import LLM
+from .sweep_job import SweepJob
+
+logger = ItakelloLogging().get_logger(__name__)
+
+
+@dataclass
+class SweepScheduler:
+    jobs: InitVar[list[SweepJob]]
+    max_resident_models: int = DEFAULT_MAX_RESIDENT_MODELS
+
+    # Jobs grouped by model, in order of first appearance
+    queues: dict[str, deque[SweepJob]] = field(default_factory=dict, init=False)
+    active: list[SweepJob] = field(default_factory=list, init=False)
+    # Models currently allowed in memory, per backend
+    resident: dict[str, set[str]] = field(
+        default_factory=lambda: defaultdict(set), init=False
+    )
+
+    def __post_init__(self, jobs: list[SweepJob]) -> None:
+        for job in jobs:
+            self.queues.setdefault(job.model_key, deque()).append(job)
+
+    def has_pending(self) -> bool:
+        return any(self.queues.values())
+
+    def next_job(self, is_available: Callable[[SweepJob], bool]) -> SweepJob | None:
+        for queue in self.queues.values():
+            if not queue or not is_available(queue[0]) or not self._reserve(queue[0]):
+                continue
+            job = queue.popleft()
+            self.active.append(job)
+            if not queue:
+                # The model is draining: load the next one while its last jobs run
+                self._prewarm_next(job)
+            return job
+        return None
+
+    def finish(self, job: SweepJob) -> None:
+        self.active.remove(job)
+        for llm in self._get_models(job):
+            if not self._is_needed(llm):
+                self._release(llm)
+
+    def _reserve(self, job: SweepJob) -> bool:
+        # Every model of the job counts against the limit, helpers included
+        needed: dict[str, set[str]] = defaultdict(set)
+        for llm in self._get_models(job):
+            needed[llm.backend].add(llm.config["model"])
+        for backend, models in needed.items():
+            # A job needing more models than the limit still runs, on its own
+            limit = max(self.max_resident_models, len(models))
+            if len(self.resident[backend] | models) > limit:
+                return False
+        for backend, models in needed.items():
+            for model in models - self.resident[backend]:
+                logger.debug(f"Model [{model}] scheduled on [{backend}]")
+            self.resident[backend] |= models
+        return True
+
+    def _prewarm_next(self, current: SweepJob) -> None:
+        for queue in self.queues.values():
+            if not queue or queue[0].backend != current.backend:
+                continue
+            job = queue[0]
+            if not job.llm.is_ollama:
+                continue
+            if job.llm.config["model"] in self.resident[job.backend]:
+                continue
+            missing = [
+                llm
+                for llm in self._get_models(job)
+                if llm.config["model"] not in self.resident[llm.backend]
+            ]
+            if not self._reserve(job):
+                return
+            for llm in missing:
+                logger.info(f"Pre-warming model [{llm.config['model']}]")
+                self._in_background(llm, lambda llm: llm.load(PREWARM_KEEP_ALIVE))
+            return
+
+    def _is_needed(self, llm: LLM) -> bool:
+        # By a running job or by one still waiting
+        jobs = self.active + [job for queue in self.queues.values() for job in queue]
+        return any(
+            (other.backend, other.config["model"]) == (llm.backend, llm.config["model"])
+            for job in jobs
+            for other in self._get_models(job)
+        )
+
+    def _release(self, llm: LLM) -> None:
+        self.resident[llm.backend].discard(llm.config["model"])
+        self._in_background(llm, lambda llm: llm.unload())
+
+    def _get_models(self, job: SweepJob) -> list[LLM]:
+        # Only Ollama models take memory on the backend
+        return [llm for llm in job.llms if llm.is_ollama]
+
+    def _in_background(self, llm: LLM, action: Callable[[LLM], None]) -> None:
+        def target() -> None:
+            try:
+                action(llm)
+            except Exception as e:
+                logger.warning(f"Model [{llm.config['model']}] operation failed: {e}")
+
+        threading.Thread(target=target, daemon=True).start()
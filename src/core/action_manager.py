@@ -51,6 +51,8 @@ class ActionManager(BaseManager):
         go_back = False
         if action == "Perform new conversations":
             self.conversation_m.perform_conversations(experiment)
+        elif action == "Resume sweep":
+            self.conversation_m.resume_sweep(experiment)
         elif action == "Duplicate and update experiment":
             self.experiment_m.duplicate_and_update_experiment(experiment)
             if experiment != None:
@@ -73,6 +75,8 @@ class ActionManager(BaseManager):
                 conversation, go_back = self.experiment_settings(experiment)
         elif action == "Save experiment to file":
             self.output_m.save_to_file(experiment)
+        elif action == "View token usage":
+            self.experiment_m.view_usage(experiment)
         elif action == "Delete experiment":
             if experiment.creator != self.db_m.username:
                 logger.warning(
@@ -107,6 +111,8 @@ class ActionManager(BaseManager):
             "Save experiment to file",
             "Select old conversations",
             "Delete experiment",
+            "Resume sweep",
+            "View token usage",
             "Go back",
         ]
         if CustomOS.getenv("APP_MODE", "") == DEV_MODE:
@@ -1,8 +1,10 @@
 import os
+from collections.abc import Iterator
 from dataclasses import dataclass, field
 
 from bson.objectid import ObjectId
 from itakello_logging import ItakelloLogging
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, UpdateMany, UpdateOne
 from pymongo.database import Database
 from pymongo.errors import (
     ConfigurationError,
@@ -16,9 +18,12 @@ from ..interfaces import BaseManager
 from ..components.conversation.conversation import Conversation
 from ..components.conversation.message import Message
 from ..components.experiment.experiment import Experiment
-from ..utility.consts import DEFAULT_DATABASE, DEV_MODE
+from ..components.llm.usage import Usage
+from ..components.sweep.sweep import Sweep, SweepCell
+from ..utility.consts import DEFAULT_DATABASE, DEV_MODE, MESSAGE_BATCH_SIZE
 from ..utility.custom_os import CustomOS
 from .input_manager import InputManager
+from .write_batch import WriteBatch
 
 logger = ItakelloLogging().get_logger(__name__)
 
@@ -33,6 +38,8 @@ class DatabaseManager(BaseManager):
     def __post_init__(self) -> None:
         self.username, client = self._ask_credentials()
         self._select_database(client)
+        self._create_indexes()
+        self._link_messages()
         super().__post_init__()
 
     def _ask_credentials(self) -> tuple[str, MongoClient]:
@@ -126,17 +133,117 @@ class DatabaseManager(BaseManager):
         logger.debug(f"Databases found: {databases}")
         return databases
 
+    def _create_indexes(self) -> None:
+        # A transcript is a range scan, already sorted by day and index
+        self.db.messages.create_index(
+            [("conversation_id", ASCENDING), ("day", ASCENDING), ("index", ASCENDING)]
+        )
+        self.db.messages.create_index([("experiment_id", ASCENDING)])
+        self.db.conversations.create_index(
+            [("experiment_id", ASCENDING), ("creation_date", DESCENDING)]
+        )
+        self.db.sweeps.create_index([("experiment_id", ASCENDING)])
+
+    def _link_messages(self) -> None:
+        # Older messages only appear in the messages_ids of their conversation
+        if self.db.migrations.find_one({"_id": "message_links"}) is not None:
+            return
+        n_conversations = 0
+        for experiment_doc in self.db.experiments.find({}, {"conversation_ids": 1}):
+            conversation_ids = experiment_doc.get("conversation_ids", [])
+            if not conversation_ids:
+                continue
+            operations = [
+                UpdateMany(
+                    {"_id": {"$in": conversation_doc["messages_ids"]}},
+                    {
+                        "$set": {
+                            "conversation_id": conversation_doc["_id"],
+                            "experiment_id": experiment_doc["_id"],
+                        }
+                    },
+                )
+                for conversation_doc in self.db.conversations.find(
+                    {"_id": {"$in": conversation_ids}}, {"messages_ids": 1}
+                )
+            ]
+            if operations:
+                self.db.messages.bulk_write(operations, ordered=False)
+            self.db.conversations.update_many(
+                {"_id": {"$in": conversation_ids}},
+                {"$set": {"experiment_id": experiment_doc["_id"]}},
+            )
+            n_conversations += len(operations)
+        self.db.migrations.insert_one({"_id": "message_links"})
+        logger.debug(f"Messages of {n_conversations} conversations linked")
+
     def save_experiment(self, experiment: Experiment) -> None:
         self.db.experiments.insert_one(experiment.to_document())
+        experiment.mark_saved()
         logger.debug(f"Experiment saved with ID: {experiment.id}")
 
-    def get_experiments(self) -> dict[str, Experiment]:
-        experiment_docs = list(self.db.experiments.find())
-        experiments = {
-            str(doc["_id"]): Experiment.from_document(doc) for doc in experiment_docs
-        }
-        logger.debug(f"Experiments retrieved: {len(experiments)}")
-        return experiments
+    def get_experiment(self, experiment_id: ObjectId) -> Experiment | None:
+        experiment_doc = self.db.experiments.find_one({"_id": experiment_id})
+        if experiment_doc is None:
+            return None
+        experiment = Experiment.from_document(experiment_doc)
+        experiment.mark_saved()
+        return experiment
+
+    def get_experiment_summaries(self, skip: int, limit: int) -> tuple[list[dict], int]:
+        # Only what the menu shows, newest first, see Experiment.to_summary
+        pipeline = [
+            {"$sort": {"creation_date": DESCENDING}},
+            {"$skip": skip},
+            {"$limit": limit},
+            {
+                "$project": {
+                    "n_conversations": {
+                        "$size": {"$ifNull": ["$conversation_ids", []]}
+                    },
+                    "creator": 1,
+                    "creation_date": 1,
+                    "roles": "$roles.name",
+                    "llms": "$llms.model",
+                    "favourite": 1,
+                    "note": 1,
+                }
+            },
+        ]
+        summaries = list(self.db.experiments.aggregate(pipeline))
+        total = self.db.experiments.count_documents({})
+        logger.debug(f"Experiment summaries retrieved: {len(summaries)}/{total}")
+        return summaries, total
+
+    def get_conversation_summaries(
+        self, experiment: Experiment, skip: int, limit: int
+    ) -> tuple[list[dict], int]:
+        # Served by the (experiment_id, creation_date) index, see Conversation.to_summary
+        query = {"experiment_id": experiment.id}
+        summaries = list(
+            self.db.conversations.find(
+                query,
+                {
+                    "n_messages": 1,
+                    "creator": 1,
+                    "creation_date": 1,
+                    "speaker_selection_method": 1,
+                    "days": 1,
+                    "llm": 1,
+                    "agent_combination": 1,
+                    "status": 1,
+                    "completed_days": 1,
+                    "stop_reason": 1,
+                    "favourite": 1,
+                },
+            )
+            .sort("creation_date", DESCENDING)
+            .skip(skip)
+            .limit(limit)
+        )
+        total = self.db.conversations.count_documents(query)
+        logger.debug(f"Conversation summaries retrieved: {len(summaries)}/{total}")
+        return summaries, total
 
     def get_conversations(
         self, conversation_ids: list[ObjectId]
@@ -149,71 +256,254 @@ class DatabaseManager(BaseManager):
             str(doc["_id"]): Conversation.from_document(doc)
             for doc in conversation_docs
         }
+        for conversation in conversations.values():
+            conversation.mark_saved()
         logger.debug(f"Conversations retrieved: {len(conversation_docs)}")
         return conversations
 
-    def get_messages(self, message_ids: list[ObjectId]) -> dict[str, Message]:
-        # Retrieve the messages from the database
-        message_docs = list(self.db.messages.find({"_id": {"$in": message_ids}}))
-        messages = {str(doc["_id"]): Message.from_document(doc) for doc in message_docs}
-        logger.debug(f"Messages retrieved: {len(message_docs)}")
-        return messages
+    def get_conversation(self, conversation_id: ObjectId) -> Conversation | None:
+        conversation_doc = self.db.conversations.find_one({"_id": conversation_id})
+        if conversation_doc is None:
+            return None
+        conversation = Conversation.from_document(conversation_doc)
+        conversation.mark_saved()
+        return conversation
+
+    def iter_messages(
+        self,
+        conversation_id: ObjectId,
+        fields: list[str] | None = None,
+        batch_size: int = MESSAGE_BATCH_SIZE,
+    ) -> Iterator[Message]:
+        # Transcript order, fetched batch_size messages at a time
+        projection = None
+        if fields is not None:
+            # A Message cannot be created without these, the others get defaults
+            required = ["index", "day", "role", "speaker", "content"]
+            projection = dict.fromkeys(required + fields, 1)
+        n_messages = 0
+        with self.db.messages.find(
+            {"conversation_id": conversation_id}, projection, batch_size=batch_size
+        ).sort([("day", ASCENDING), ("index", ASCENDING)]) as cursor:
+            for doc in cursor:
+                n_messages += 1
+                yield Message.from_document(doc)
+        logger.debug(f"Messages retrieved: {n_messages}")
+
+    def get_message_usage(self, match: dict, group_by: str) -> dict[str, Usage]:
+        # match: e.g. {"conversation_id": ...} or {"experiment_id": ...}
+        pipeline = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": f"${group_by}",
+                    # Cached replies and the starting message took no request
+                    "requests": {"$sum": {"$cond": [{"$gt": ["$latency", 0]}, 1, 0]}},
+                    "prompt_tokens": {"$sum": "$prompt_tokens"},
+                    "completion_tokens": {"$sum": "$completion_tokens"},
+                    "latency": {"$sum": "$latency"},
+                }
+            },
+            {"$sort": {"_id": 1}},
+        ]
+        usage = {
+            str(doc["_id"]): Usage.from_document(doc)
+            for doc in self.db.messages.aggregate(pipeline)
+        }
+        logger.debug(f"Message usage retrieved by {group_by}: {len(usage)} groups")
+        return usage
+
+    def get_conversation_usage(
+        self, conversation_ids: list[ObjectId], group_by: str
+    ) -> dict[str, Usage]:
+        pipeline = [
+            {"$match": {"_id": {"$in": conversation_ids}}},
+            {
+                "$group": {
+                    "_id": f"${group_by}",
+                    "requests": {"$sum": "$usage.requests"},
+                    "prompt_tokens": {"$sum": "$usage.prompt_tokens"},
+                    "completion_tokens": {"$sum": "$usage.completion_tokens"},
+                    "latency": {"$sum": "$usage.latency"},
+                }
+            },
+            {"$sort": {"_id": 1}},
+        ]
+        usage = {
+            str(doc["_id"]): Usage.from_document(doc)
+            for doc in self.db.conversations.aggregate(pipeline)
+        }
+        logger.debug(f"Conversation usage retrieved by {group_by}: {len(usage)} groups")
+        return usage
 
     def update_experiment(self, experiment: Experiment) -> None:
-        self.db.experiments.update_one(
-            {"_id": experiment.id},
-            {"$set": experiment.to_document()},
+        # Only the fields changed since the experiment was loaded are sent
+        update = experiment.get_update()
+        if update:
+            self.db.experiments.update_one({"_id": experiment.id}, update)
+        experiment.mark_saved()
+        logger.debug(
+            f"Experiment updated with ID: {experiment.id} ({', '.join(update) or 'no changes'})"
         )
-        logger.debug(f"Experiment updated with ID: {experiment.id}")
 
     def update_conversation(self, conversation: Conversation) -> None:
-        self.db.conversations.update_one(
-            {"_id": conversation.id},
-            {"$set": conversation.to_document()},
+        update = conversation.get_update()
+        if update:
+            self.db.conversations.update_one({"_id": conversation.id}, update)
+        conversation.mark_saved()
+        logger.debug(
+            f"Conversation updated with ID: {conversation.id} ({', '.join(update) or 'no changes'})"
         )
-        logger.debug(f"Conversation updated with ID: {conversation.id}")
 
-    def save_conversation(
-        self,
-        experiment: Experiment,
-        conversation: Conversation,
-        messages: list[Message],
-    ) -> ObjectId:
-        conversation.messages_ids = self._save_messages(messages)
-        conversation_id = self.db.conversations.insert_one(
-            conversation.to_document()
-        ).inserted_id
-        experiment.conversation_ids.append(conversation_id)
-        self.update_experiment(experiment)
-        logger.debug(f"Conversation saved with ID: {conversation_id}")
-        return conversation_id
-
-    def _save_messages(self, messages: list[Message]) -> list[ObjectId]:
-        documents = [message.to_document() for message in messages]
-        result = self.db.messages.insert_many(documents)
-        message_ids = result.inserted_ids
-        logger.debug(f"Messages saved with IDs: {message_ids}")
-        return message_ids
-
-    def add_conversation(self, experiment_id: ObjectId, conversation: ObjectId) -> None:
+    def save_batch(self, batch: WriteBatch) -> None:
+        # Unordered bulk writes: a constant number of round trips per batch
+        if batch.is_empty:
+            return
+        # The cells point to their new conversations before these are inserted,
+        # so a crash in between never leaves a conversation without its cell
+        links = [
+            UpdateOne(
+                {"_id": sweep_id, "cells.index": index},
+                {"$set": {"cells.$.conversation_id": cell.conversation_id}},
+            )
+            for (sweep_id, index), cell in batch.cells.items()
+            if cell.conversation_id in batch.new_conversations
+        ]
+        if links:
+            self.db.sweeps.bulk_write(links, ordered=False)
+        if batch.messages:
+            self.db.messages.insert_many(
+                [message.to_document() for message in batch.messages], ordered=False
+            )
+        operations = [
+            (
+                # Upserted, a resumed cell may have saved it before a crash
+                ReplaceOne(
+                    {"_id": conversation_id}, conversation.to_document(), upsert=True
+                )
+                if conversation_id in batch.new_conversations
+                else UpdateOne(
+                    {"_id": conversation_id},
+                    self._get_progress_update(
+                        conversation, batch.pushed_messages.get(conversation_id, [])
+                    ),
+                )
+            )
+            for conversation_id, conversation in batch.conversations.items()
+        ]
+        if operations:
+            self.db.conversations.bulk_write(operations, ordered=False)
+        conversation_ids: dict[ObjectId, list[ObjectId]] = {}
+        for conversation_id, experiment_id in batch.new_conversations.items():
+            conversation_ids.setdefault(experiment_id, []).append(conversation_id)
+        for experiment_id, ids in conversation_ids.items():
+            self._push_conversation_ids(experiment_id, ids)
+        for experiment in batch.experiments.values():
+            experiment.mark_saved("conversation_ids")
+        if batch.cells:
+            self.db.sweeps.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": sweep_id, "cells.index": index},
+                        self._get_cell_update(cell),
+                    )
+                    for (sweep_id, index), cell in batch.cells.items()
+                ],
+                ordered=False,
+            )
+        logger.debug(
+            f"Batch saved: {len(batch.messages)} messages, {len(operations)} conversations, {len(batch.cells)} sweep cells"
+        )
+        batch.clear()
+
+    def _get_progress_update(
+        self, conversation: Conversation, message_ids: list[ObjectId]
+    ) -> dict:
+        return {
+            "$set": {
+                "status": conversation.status.value,
+                "completed_days": conversation.completed_days,
+                "summaries": conversation.summaries,
+                "usage": conversation.usage.to_document(),
+                "compacted_summary": conversation.compacted_summary,
+                "compacted_days": conversation.compacted_days,
+                "stop_reason": conversation.stop_reason,
+                "stop_turn": conversation.stop_turn,
+            },
+            "$push": {"messages_ids": {"$each": message_ids}},
+        }
+
+    def _push_conversation_ids(
+        self, experiment_id: ObjectId, conversation_ids: list[ObjectId]
+    ) -> None:
+        # Only the new ids are sent, not the whole experiment
         self.db.experiments.update_one(
             {"_id": experiment_id},
-            {"$push": {"conversations": conversation}},
+            {"$push": {"conversation_ids": {"$each": conversation_ids}}},
+        )
+
+    def discard_partial_day(self, conversation: Conversation) -> None:
+        partial_ids = [
+            doc["_id"]
+            for doc in self.db.messages.find(
+                {
+                    "conversation_id": conversation.id,
+                    "day": {"$gt": conversation.completed_days},
+                },
+                {"_id": 1},
+            )
+        ]
+        if not partial_ids:
+            return
+        self.db.messages.delete_many({"_id": {"$in": partial_ids}})
+        self.db.conversations.update_one(
+            {"_id": conversation.id},
+            {"$pull": {"messages_ids": {"$in": partial_ids}}},
+        )
+        conversation.messages_ids = [
+            message_id
+            for message_id in conversation.messages_ids
+            if message_id not in partial_ids
+        ]
+        logger.debug(
+            f"Discarded {len(partial_ids)} messages of the unfinished day of conversation {conversation.id}"
         )
-        logger.debug(f"Added conversation {conversation} to experiment {experiment_id}")
+
+    def save_sweep(self, sweep: Sweep) -> None:
+        self.db.sweeps.insert_one(sweep.to_document())
+        logger.debug(f"Sweep saved with ID: {sweep.id}")
+
+    def get_sweeps(self, experiment: Experiment) -> dict[str, Sweep]:
+        sweep_docs = list(self.db.sweeps.find({"experiment_id": experiment.id}))
+        sweeps = {str(doc["_id"]): Sweep.from_document(doc) for doc in sweep_docs}
+        logger.debug(f"Sweeps retrieved: {len(sweeps)}")
+        return sweeps
+
+    def update_sweep_cell(self, sweep: Sweep, cell: SweepCell) -> None:
+        self.db.sweeps.update_one(
+            {"_id": sweep.id, "cells.index": cell.index},
+            self._get_cell_update(cell),
+        )
+        logger.debug(f"Sweep {sweep.id} cell {cell.index} set to {cell.status.value}")
+
+    def _get_cell_update(self, cell: SweepCell) -> dict:
+        return {
+            "$set": {
+                "cells.$.status": cell.status.value,
+                "cells.$.conversation_id": cell.conversation_id,
+            }
+        }
 
     def delete_experiment(self, experiment: Experiment) -> None:
         # Delete the conversations and messages associated with the experiment
-        for conversation_id in experiment.conversation_ids:
-            conversation_doc = self.db.conversations.find_one({"_id": conversation_id})
-            conversation = Conversation.from_document(conversation_doc)  # type: ignore
-            self.db.messages.delete_many({"_id": {"$in": conversation.messages_ids}})
-            self.db.conversations.delete_one({"_id": conversation_id})
-            logger.debug(f"Deleted conversation with ID: {conversation_id}")
+        self.db.messages.delete_many({"experiment_id": experiment.id})
+        self.db.conversations.delete_many({"_id": {"$in": experiment.conversation_ids}})
+        logger.debug(f"Deleted {len(experiment.conversation_ids)} conversations")
+        self.db.sweeps.delete_many({"experiment_id": experiment.id})
         self.db.experiments.delete_one({"_id": experiment.id})
         logger.debug(f"Deleted experiment with ID: {experiment.id}")
 
     def delete_conversation(self, conversation: Conversation) -> None:
-        self.db.messages.delete_many({"_id": {"$in": conversation.messages_ids}})
+        self.db.messages.delete_many({"conversation_id": conversation.id})
         self.db.conversations.delete_one({"_id": conversation.id})
         logger.debug(f"Deleted conversation with ID: {conversation.id}")
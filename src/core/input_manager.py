@@ -1,4 +1,6 @@
 from dataclasses import dataclass, field
+from math import ceil
+from typing import Callable
 
 import inquirer3
 from inquirer3.render.console import ConsoleRender
@@ -6,9 +8,13 @@ from inquirer3.themes import GreenPassion
 from itakello_logging import ItakelloLogging
 
 from ..interfaces import BaseManager
+from ..utility.consts import SELECTION_PAGE_SIZE
 
 logger = ItakelloLogging().get_logger(__name__)
 
+NEXT_PAGE = "__next_page__"
+PREVIOUS_PAGE = "__previous_page__"
+
 
 @dataclass
 class InputManager(BaseManager):
@@ -159,6 +165,35 @@ class InputManager(BaseManager):
         logger.debug(f"Input: {user_input}")
         return user_input
 
+    def select_page(
+        self,
+        message: str,
+        get_choices: Callable[[int, int], tuple[list[tuple[str, str]], int]],
+        page_size: int = SELECTION_PAGE_SIZE,
+    ) -> str | None:
+        # get_choices(skip, limit) returns the choices of a page and the total count
+        page = 0
+        while True:
+            choices, total = get_choices(page * page_size, page_size)
+            if not total:
+                return None
+            n_pages = max(ceil(total / page_size), 1)
+            if page + 1 < n_pages:
+                choices.append(("Next page ➡", NEXT_PAGE))
+            if page > 0:
+                choices.append(("⬅ Previous page", PREVIOUS_PAGE))
+            if n_pages > 1:
+                message_page = f"{message} (page {page + 1}/{n_pages})"
+            else:
+                message_page = message
+            user_input = self.select_one(message_page, choices)
+            if user_input == NEXT_PAGE:
+                page += 1
+            elif user_input == PREVIOUS_PAGE:
+                page -= 1
+            else:
+                return user_input
+
     def select_multiple(
         self,
         message: str,
@@ -65,12 +65,10 @@ class OutputManager(BaseManager):
             / f"{id}.txt"
         )
         conversation_path.parent.mkdir(parents=True, exist_ok=True)
-        messages = self.db_m.get_messages(conversation.messages_ids)
-        content = ""
-        for message in messages.values():
-            content += (
-                f"[Day {message.day}] {message.speaker}:\n\n{message.content}\n\n"
-            )
+        messages = self.db_m.iter_messages(conversation.id, fields=[])
         with open(conversation_path, "w") as f:
-            f.write(content)
+            for message in messages:
+                f.write(
+                    f"[Day {message.day}] {message.speaker}:\n\n{message.content}\n\n"
+                )
         logger.debug(f"Conversation {conversation.id} saved to {conversation_path}")
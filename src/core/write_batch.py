@@ -0,0 +1,86 @@
+import time
+from dataclasses import dataclass, field
+
+from bson.objectid import ObjectId
+
+from ..components.conversation.conversation import Conversation
+from ..components.conversation.message import Message
+from ..components.experiment.experiment import Experiment
+from ..components.sweep.sweep import Sweep, SweepCell
+from ..utility.consts import DEFAULT_WRITE_BATCH_SIZE, DEFAULT_WRITE_MAX_LATENCY
+
+
+@dataclass
+class WriteBatch:
+    # Pending writes of a sweep, saved together by DatabaseManager.save_batch
+    max_size: int = DEFAULT_WRITE_BATCH_SIZE
+    max_latency: float = DEFAULT_WRITE_MAX_LATENCY
+
+    messages: list[Message] = field(default_factory=list, init=False)
+    # Latest state of each conversation, the new ones are inserted whole
+    conversations: dict[ObjectId, Conversation] = field(
+        default_factory=dict, init=False
+    )
+    new_conversations: dict[ObjectId, ObjectId] = field(
+        default_factory=dict, init=False
+    )
+    experiments: dict[ObjectId, Experiment] = field(default_factory=dict, init=False)
+    pushed_messages: dict[ObjectId, list[ObjectId]] = field(
+        default_factory=dict, init=False
+    )
+    cells: dict[tuple[ObjectId, int], SweepCell] = field(
+        default_factory=dict, init=False
+    )
+    n_writes: int = field(default=0, init=False)
+    started: float | None = field(default=None, init=False)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.messages or self.conversations or self.cells)
+
+    def add_conversation(
+        self,
+        experiment: Experiment,
+        conversation: Conversation,
+        messages: list[Message],
+    ) -> None:
+        if conversation.id not in experiment.conversation_ids:
+            experiment.conversation_ids.append(conversation.id)
+            self.new_conversations[conversation.id] = experiment.id
+            self.experiments[experiment.id] = experiment
+        elif conversation.id not in self.new_conversations:
+            self.pushed_messages.setdefault(conversation.id, []).extend(
+                message.id for message in messages
+            )
+        self.conversations[conversation.id] = conversation
+        self.messages.extend(messages)
+        self._count()
+
+    def add_cell(self, sweep: Sweep, cell: SweepCell) -> None:
+        # Linked before the conversations are inserted, but only marked done after
+        self.cells[(sweep.id, cell.index)] = cell
+        if self.started is None:
+            self.started = time.monotonic()
+
+    def is_due(self) -> bool:
+        if self.n_writes >= self.max_size:
+            return True
+        return (
+            self.started is not None
+            and time.monotonic() - self.started >= self.max_latency
+        )
+
+    def clear(self) -> None:
+        self.messages = []
+        self.conversations = {}
+        self.new_conversations = {}
+        self.experiments = {}
+        self.pushed_messages = {}
+        self.cells = {}
+        self.n_writes = 0
+        self.started = None
+
+    def _count(self) -> None:
+        self.n_writes += 1
+        if self.started is None:
+            self.started = time.monotonic()
@@ -1,8 +1,11 @@
+import copy
 from abc import ABC, abstractmethod
 from typing import Any
 
 
 class MongoModel(ABC):
+    # Document as last loaded from or saved to the database
+    _saved_document: dict | None = None
 
     @abstractmethod
     def to_document(self) -> dict | str:
@@ -27,3 +30,89 @@ class MongoModel(ABC):
             DocumentSerializer: An object representation of the dictionary.
         """
         pass
+
+    def mark_saved(self, *keys: str) -> None:
+        """
+        Records the current state as the one stored in the database.
+
+        Args:
+            keys (str): The top-level fields written, all of them if empty.
+        """
+        document = self.to_document()
+        assert isinstance(document, dict)
+        if not keys or self._saved_document is None:
+            self._saved_document = copy.deepcopy(document)
+            return
+        for key in keys:
+            self._saved_document[key] = copy.deepcopy(document[key])
+
+    def get_update(self) -> dict:
+        """
+        Computes the minimal update from the stored document to the current state.
+
+        Returns:
+            dict: The $set, $unset, $push and $pull operators, empty if nothing changed.
+        """
+        document = self.to_document()
+        assert isinstance(document, dict)
+        document.pop("_id", None)
+        if self._saved_document is None:
+            return {"$set": document}
+        update: dict[str, dict] = {}
+        _diff(self._saved_document, document, "", update)
+        return update
+
+
+def _diff(old: dict, new: dict, prefix: str, update: dict[str, dict]) -> None:
+    for key, value in new.items():
+        path = f"{prefix}{key}"
+        if key == "_id" or (key in old and old[key] == value):
+            continue
+        previous = old.get(key)
+        if (
+            isinstance(previous, dict)
+            and isinstance(value, dict)
+            and _is_safe(previous)
+            and _is_safe(value)
+        ):
+            _diff(previous, value, f"{path}.", update)
+        elif isinstance(previous, list) and isinstance(value, list):
+            _diff_list(previous, value, path, update)
+        else:
+            update.setdefault("$set", {})[path] = value
+    for key in old.keys() - new.keys() - {"_id"}:
+        update.setdefault("$unset", {})[f"{prefix}{key}"] = ""
+
+
+def _diff_list(old: list, new: list, path: str, update: dict[str, dict]) -> None:
+    # Changed, appended and removed items are sent alone, any other change resets the list
+    if len(new) == len(old):
+        for index, (before, after) in enumerate(zip(old, new)):
+            if before == after:
+                continue
+            if (
+                isinstance(before, dict)
+                and isinstance(after, dict)
+                and _is_safe(before)
+                and _is_safe(after)
+            ):
+                _diff(before, after, f"{path}.{index}.", update)
+            else:
+                update.setdefault("$set", {})[f"{path}.{index}"] = after
+        return
+    if len(new) > len(old) and new[: len(old)] == old:
+        update.setdefault("$push", {})[path] = {"$each": new[len(old) :]}
+        return
+    removed = [item for item in old if item not in new]
+    if removed and new == [item for item in old if item not in removed]:
+        update.setdefault("$pull", {})[path] = {"$in": removed}
+        return
+    update.setdefault("$set", {})[path] = new
+
+
+def _is_safe(document: dict) -> bool:
+    # Keys taken from user input may not be valid in a dotted path
+    return all(
+        isinstance(key, str) and key and "." not in key and not key.startswith("$")
+        for key in document
+    )
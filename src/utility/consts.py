@@ -2,8 +2,75 @@ TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 DEFAULT_DATABASE = "test"
 
+SELECTION_PAGE_SIZE = 20
+MESSAGE_BATCH_SIZE = 200
+
 DEV_MODE = "development"
 
 OUTPUT_FOLDER = "experiments"
 
 MAX_CONTEXT_LEN = 10000
+
+DEFAULT_SWEEP_WORKERS = 1
+
+DEFAULT_BACKEND_CONCURRENCY = 2
+
+FLUSH_POLL_INTERVAL = 1.0
+
+DEFAULT_WRITE_BATCH_SIZE = 20
+
+DEFAULT_WRITE_MAX_LATENCY = 10.0
+
+MAX_RETRIES = 3
+
+RESPONSE_CACHE_PATH = ".cache/responses.sqlite"
+
+RESPONSE_CACHE_MAX_ENTRIES = 100000
+
+RESPONSE_CACHE_EVICTION_TARGET = 0.9
+
+DEFAULT_MAX_RESIDENT_MODELS = 2
+
+PREWARM_KEEP_ALIVE = "10m"
+
+DEFAULT_OLLAMA_BASE_URL = "http://localhost:11434/v1"
+
+ENDPOINT_COOLDOWN = 30.0
+
+ENDPOINT_PROBE_TIMEOUT = 2.0
+
+RETRY_BASE_DELAY = 1.0
+
+RETRY_MAX_DELAY = 30.0
+
+RETRY_BUDGET_RATIO = 0.2
+
+RETRY_BUDGET_MIN = 10
+
+CIRCUIT_FAILURE_THRESHOLD = 5
+
+CHARS_PER_TOKEN = 4
+
+DEFAULT_COMPLETION_TOKENS = 256
+
+RATE_LIMIT_PAUSE = 5.0
+
+MESSAGE_TOKEN_OVERHEAD = 4
+
+CONTEXT_SUMMARY_SHARE = 0.25
+
+MIN_PROMPT_SHARE = 0.5
+
+PARTIAL_SUMMARY_PROMPT = "Summary of the earlier part of the day:"
+
+COMPACTION_PROMPT = "Merge the following summaries of the previous days into a single concise summary. Keep the key events, decisions and relationships between the participants, oldest first."
+
+SPEAKER_CACHE_WINDOW = 2
+
+JUDGE_WINDOW = 4
+
+MAX_STOP_SEQUENCES = 4
+
+DEFAULT_HTTP_POOL_SIZE = 32
+
+HTTP_KEEPALIVE_EXPIRY = 60.0
@@ -27,3 +27,33 @@ class SectionType(Enum):
             members = list(self.__class__)
             return members.index(self) > members.index(other)
         return NotImplemented
+
+
+class SweepStatus(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ConversationStatus(Enum):
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
+
+class SamplingMode(Enum):
+    MODELFILE = "modelfile"
+    REQUEST = "request"
+
+
+class SpeakerSelectorType(Enum):
+    LLM = "llm"
+    SMALL_LLM = "small_llm"
+    RULES = "rules"
+    CACHED = "cached"
+
+
+class StreamMode(Enum):
+    OFF = "off"
+    METRICS = "metrics"
+    LIVE = "live"
@@ -0,0 +1,31 @@
+from src.components.llm.context_budget import ContextBudget
+from src.components.llm.tokens import count_messages_tokens
+from src.utility.consts import MIN_PROMPT_SHARE
+
+SYSTEM = {"role": "system", "content": "s" * 400}
+OPENING = {"role": "user", "content": "o" * 200}
+TURNS = [{"role": "assistant", "content": f"turn {i} " * 10} for i in range(20)]
+
+
+def test_fit_keeps_the_prompts_and_the_latest_turns() -> None:
+    fitted = ContextBudget(max_tokens=200).fit([SYSTEM, OPENING] + TURNS)
+    assert fitted[:2] == [SYSTEM, OPENING]
+    assert fitted[-1] == TURNS[-1]
+    assert count_messages_tokens(fitted) <= 200
+
+
+def test_fit_reserves_the_completion() -> None:
+    fitted = ContextBudget(max_tokens=200).fit([SYSTEM, OPENING] + TURNS, 60)
+    assert count_messages_tokens(fitted) <= 140
+
+
+def test_small_budget_cuts_every_prompt() -> None:
+    fitted = ContextBudget(max_tokens=90).fit([SYSTEM, OPENING] + TURNS)
+    assert count_messages_tokens(fitted) <= 90
+    assert 0 < len(fitted[1]["content"]) < len(OPENING["content"])
+    assert len(fitted[0]["content"]) < len(SYSTEM["content"])
+
+
+def test_instructions_keep_a_minimum_share() -> None:
+    fitted = ContextBudget(max_tokens=10).fit([SYSTEM, OPENING] + TURNS)
+    assert len(fitted[0]["content"]) >= len(SYSTEM["content"]) * MIN_PROMPT_SHARE
@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.components.conversation.speaker_selector import LLMSpeakerSelector
+
+
+class CountingClient:
+    def __init__(self) -> None:
+        self.requests = 0
+
+    def create(self, messages: list[dict]) -> str:
+        self.requests += 1
+        # Names the first candidate listed in the selection prompt
+        return messages[-1]["content"].split("'")[1]
+
+    async def a_create(self, messages: list[dict]) -> str:
+        return self.create(messages)
+
+
+def make_chat(n_agents: int) -> SimpleNamespace:
+    agents = [SimpleNamespace(name=f"Agent_{i}") for i in range(n_agents)]
+    return SimpleNamespace(
+        agents=agents,
+        messages=[{"content": "Start", "name": "Researcher"}],
+        select_speaker_msg=lambda agents: "Select the next speaker.",
+        next_agent=lambda agent: agents[0],
+    )
+
+
+def run_turns(chat: SimpleNamespace, select, n_turns: int) -> list[str]:
+    speakers = []
+    last_speaker = SimpleNamespace(name="Researcher")
+    for _ in range(n_turns):
+        last_speaker = select(chat, last_speaker)
+        chat.messages.append({"content": "...", "name": last_speaker.name})
+        speakers.append(last_speaker.name)
+    return speakers
+
+
+def test_two_agents_only_ask_for_the_first_speaker() -> None:
+    client = CountingClient()
+    selector = LLMSpeakerSelector(llm_client=client)  # type: ignore
+    speakers = run_turns(make_chat(2), selector.select, n_turns=6)
+    # After the researcher both agents are candidates, then only the other one
+    assert client.requests == 1
+    assert speakers == ["Agent_0", "Agent_1"] * 3
+
+
+def test_two_agents_only_ask_for_the_first_speaker_async() -> None:
+    client = CountingClient()
+    selector = LLMSpeakerSelector(llm_client=client)  # type: ignore
+    speakers = run_turns(
+        make_chat(2),
+        lambda chat, last: asyncio.run(selector.a_select(chat, last)),
+        n_turns=6,
+    )
+    assert client.requests == 1
+    assert speakers == ["Agent_0", "Agent_1"] * 3
+
+
+def test_three_agents_ask_every_turn() -> None:
+    client = CountingClient()
+    selector = LLMSpeakerSelector(llm_client=client)  # type: ignore
+    run_turns(make_chat(3), selector.select, n_turns=6)
+    assert client.requests == 6